@@ -0,0 +1,129 @@
+import os
+import pickle
+import logging
+from pathlib import Path
+
+logger = logging.getLogger('cluster_aggregates')
+
+AGGREGATES_PATH = Path('dengue_data') / 'cluster_aggregates.pkl'
+
+def empty_aggregates():
+    """Return an aggregate store with no data folded in yet"""
+    return {
+        'monthly_cases': {},      # 'YYYY-MM' -> total Number Of Cases
+        'active_clusters': {},    # 'YYYY-MM-DD' -> clusters with recent cases > 0
+        'cluster_latest': {},     # Cluster Number -> latest row for that cluster
+        'ingested_dates': set(),  # 'YYYY-MM-DD' dates already folded in
+        'last_date': None         # latest ingested 'YYYY-MM-DD', to detect a stale store
+    }
+
+def update_aggregates(aggregates, new_rows):
+    """Fold new cluster rows into the aggregate store in O(len(new_rows))"""
+    if new_rows.empty:
+        return aggregates
+
+    new_rows = new_rows.sort_values('Date', kind='stable')
+    day = new_rows['Date'].dt.strftime('%Y-%m-%d')
+    month = new_rows['Date'].dt.to_period('M').astype(str)
+
+    # Running totals are not idempotent, so a date may only be ingested once
+    new_dates = set(day.unique())
+    already_ingested = new_dates & aggregates['ingested_dates']
+    if already_ingested:
+        raise ValueError(f"Dates already ingested: {sorted(already_ingested)}")
+
+    # Per-month case totals
+    monthly_cases = aggregates['monthly_cases']
+    for month_key, cases in new_rows.groupby(month)['Number Of Cases'].sum().items():
+        monthly_cases[month_key] = monthly_cases.get(month_key, 0) + int(cases)
+
+    # Active cluster counts for each new date
+    active = new_rows[new_rows['Recent Cases In Cluster'] > 0]
+    active_counts = active.groupby(day[active.index])['Cluster Number'].nunique()
+    for day_key in new_dates:
+        aggregates['active_clusters'][day_key] = int(active_counts.get(day_key, 0))
+
+    # Latest state per cluster; on equal dates the last row wins
+    cluster_latest = aggregates['cluster_latest']
+    latest_rows = new_rows.drop_duplicates('Cluster Number', keep='last')
+    for record in latest_rows.to_dict(orient='records'):
+        current = cluster_latest.get(record['Cluster Number'])
+        if current is None or record['Date'] >= current['Date']:
+            cluster_latest[record['Cluster Number']] = record
+
+    aggregates['ingested_dates'] |= new_dates
+    aggregates['last_date'] = max(aggregates['ingested_dates'])
+    return aggregates
+
+def recompute_aggregates(dengue_cluster):
+    """Compute the aggregate store from the full cluster table with plain groupbys"""
+    dengue_cluster = dengue_cluster.sort_values('Date', kind='stable')
+    day = dengue_cluster['Date'].dt.strftime('%Y-%m-%d')
+    month = dengue_cluster['Date'].dt.to_period('M').astype(str)
+
+    monthly_cases = dengue_cluster.groupby(month)['Number Of Cases'].sum()
+    active = dengue_cluster['Recent Cases In Cluster'] > 0
+    active_clusters = (
+        dengue_cluster['Cluster Number'].where(active).groupby(day).nunique()
+    )
+    latest_rows = dengue_cluster.groupby('Cluster Number', sort=False).tail(1)
+
+    return {
+        'monthly_cases': {key: int(value) for key, value in monthly_cases.items()},
+        'active_clusters': {key: int(value) for key, value in active_clusters.items()},
+        'cluster_latest': {
+            record['Cluster Number']: record
+            for record in latest_rows.to_dict(orient='records')
+        },
+        'ingested_dates': set(day.unique()),
+        'last_date': day.max() if len(day) else None
+    }
+
+def check_consistency(aggregates, dengue_cluster):
+    """Compare the aggregate store against a full recompute and return any mismatches"""
+    expected = recompute_aggregates(dengue_cluster)
+    mismatches = []
+
+    for key in ('monthly_cases', 'active_clusters'):
+        for item in sorted(set(expected[key]) | set(aggregates[key])):
+            if expected[key].get(item) != aggregates[key].get(item):
+                mismatches.append(
+                    f"{key}[{item}]: expected {expected[key].get(item)}, "
+                    f"got {aggregates[key].get(item)}"
+                )
+
+    for cluster in set(expected['cluster_latest']) | set(aggregates['cluster_latest']):
+        want = expected['cluster_latest'].get(cluster)
+        have = aggregates['cluster_latest'].get(cluster)
+        if want is None or have is None:
+            mismatches.append(f"cluster_latest[{cluster}]: expected {want}, got {have}")
+        elif (want['Date'], want['Total Cases In Cluster']) != (have['Date'], have['Total Cases In Cluster']):
+            mismatches.append(
+                f"cluster_latest[{cluster}]: expected {want['Date']} / {want['Total Cases In Cluster']}, "
+                f"got {have['Date']} / {have['Total Cases In Cluster']}"
+            )
+
+    if mismatches:
+        logger.warning(f"Aggregate store has {len(mismatches)} mismatches against a full recompute")
+    else:
+        logger.info("Aggregate store matches a full recompute")
+    return mismatches
+
+def load_aggregates(path=AGGREGATES_PATH):
+    """Load the aggregate store, or an empty one if it has not been built yet"""
+    path = Path(path)
+    if not path.exists():
+        logger.info(f"No aggregate store at {path}, starting empty")
+        return empty_aggregates()
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+def save_aggregates(aggregates, path=AGGREGATES_PATH):
+    """Save the aggregate store atomically so readers never see a partial file"""
+    path = Path(path)
+    path.parent.mkdir(exist_ok=True)
+    tmp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(aggregates, f)
+    os.replace(tmp_path, path)
+    logger.info(f"Saved aggregate store to {path}")
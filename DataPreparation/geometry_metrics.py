@@ -0,0 +1,190 @@
+import numpy as np
+import pandas as pd
+import logging
+import shapely
+from shapely.geometry import shape
+
+logger = logging.getLogger('geometry_metrics')
+
+# Sinusoidal projection of authalic latitude on the WGS84 authalic sphere,
+# centred on Singapore. Authalic latitude maps the ellipsoid onto a sphere of
+# the same area and the sinusoidal projection is equal-area on that sphere,
+# so shoelace areas in projected metres are ellipsoidal areas (within 1e-8
+# of geodesic areas for parcels; edges are straight in the projection).
+WGS84_SEMI_MAJOR_AXIS_M = 6378137.0
+WGS84_ECCENTRICITY_SQ = 0.0066943799901413165
+EARTH_AUTHALIC_RADIUS_M = 6371007.181
+PROJECTION_CENTER_LON = 103.8
+
+def _authalic_q(sin_lat):
+    e = np.sqrt(WGS84_ECCENTRICITY_SQ)
+    return (1 - WGS84_ECCENTRICITY_SQ) * (
+        sin_lat / (1 - WGS84_ECCENTRICITY_SQ * sin_lat ** 2)
+        - np.log((1 - e * sin_lat) / (1 + e * sin_lat)) / (2 * e)
+    )
+
+_AUTHALIC_Q_POLE = _authalic_q(1.0)
+
+def authalic_latitude(lat_rad):
+    """Authalic latitude (radians) of geodetic latitude lat_rad on WGS84"""
+    return np.arcsin(np.clip(_authalic_q(np.sin(lat_rad)) / _AUTHALIC_Q_POLE, -1.0, 1.0))
+
+def geodetic_latitude(authalic_rad):
+    """Inverse of authalic_latitude, by its series in the eccentricity"""
+    e2 = WGS84_ECCENTRICITY_SQ
+    return (
+        authalic_rad
+        + (e2 / 3 + 31 * e2 ** 2 / 180 + 517 * e2 ** 3 / 5040) * np.sin(2 * authalic_rad)
+        + (23 * e2 ** 2 / 360 + 251 * e2 ** 3 / 3780) * np.sin(4 * authalic_rad)
+        + (761 * e2 ** 3 / 45360) * np.sin(6 * authalic_rad)
+    )
+
+def project_equal_area(lon, lat):
+    """Project lon/lat degrees to equal-area x/y metres"""
+    beta = authalic_latitude(np.radians(lat))
+    x = EARTH_AUTHALIC_RADIUS_M * np.radians(lon - PROJECTION_CENTER_LON) * np.cos(beta)
+    y = EARTH_AUTHALIC_RADIUS_M * beta
+    return x, y
+
+def unproject_equal_area(x, y):
+    """Inverse of project_equal_area"""
+    beta = y / EARTH_AUTHALIC_RADIUS_M
+    lon = PROJECTION_CENTER_LON + np.degrees(x / (EARTH_AUTHALIC_RADIUS_M * np.cos(beta)))
+    return lon, np.degrees(geodetic_latitude(beta))
+
+def shape_from_coordinates(coordinates):
+    """Create a 2D Shapely Polygon or MultiPolygon, holes included, from GeoJSON coordinates"""
+    # MultiPolygon coordinates nest one level deeper than Polygon coordinates
+    geometry_type = 'MultiPolygon' if isinstance(coordinates[0][0][0], (list, tuple)) else 'Polygon'
+    return shapely.force_2d(shape({'type': geometry_type, 'coordinates': coordinates}))
+
+def _polygons_of(geometry):
+    """Return the list of polygons (each a list of rings) in a GeoJSON geometry"""
+    geometry_type = geometry.get('type')
+    coordinates = geometry.get('coordinates')
+    if geometry_type == 'Polygon':
+        return [coordinates]
+    if geometry_type == 'MultiPolygon':
+        return coordinates
+    raise ValueError(f"unsupported geometry type {geometry_type!r}")
+
+def flatten_rings(geometries):
+    """Flatten GeoJSON geometries into one vertex array plus per-ring bookkeeping
+
+    Returns (vertices, ring_starts, ring_feature, ring_is_hole, errors), where
+    vertices is an (N, 2) lon/lat array and errors maps feature index to a
+    message for geometries that could not be read.
+    """
+    ring_arrays = []
+    ring_feature = []
+    ring_is_hole = []
+    errors = {}
+
+    for feature_idx, geometry in enumerate(geometries):
+        try:
+            rings = []
+            for polygon in _polygons_of(geometry):
+                for ring_idx, ring in enumerate(polygon):
+                    ring = np.asarray(ring, dtype=np.float64)
+                    if ring.ndim != 2 or ring.shape[1] < 2:
+                        raise ValueError(f"malformed ring with shape {ring.shape}")
+                    if len(ring) < 3:
+                        raise ValueError(f"ring with only {len(ring)} vertices")
+                    if not np.isfinite(ring[:, :2]).all():
+                        raise ValueError("non-finite coordinates")
+                    rings.append((ring[:, :2], ring_idx > 0))
+            if not rings:
+                raise ValueError("empty geometry")
+        except Exception as e:
+            errors[feature_idx] = str(e)
+            continue
+
+        for ring, is_hole in rings:
+            ring_arrays.append(ring)
+            ring_feature.append(feature_idx)
+            ring_is_hole.append(is_hole)
+
+    if ring_arrays:
+        vertices = np.concatenate(ring_arrays)
+        ring_starts = np.cumsum([0] + [len(ring) for ring in ring_arrays[:-1]])
+    else:
+        vertices = np.zeros((0, 2))
+        ring_starts = np.zeros(0, dtype=np.int64)
+
+    return (
+        vertices,
+        np.asarray(ring_starts, dtype=np.int64),
+        np.asarray(ring_feature, dtype=np.int64),
+        np.asarray(ring_is_hole, dtype=bool),
+        errors
+    )
+
+def compute_geometry_metrics(geometries):
+    """Compute true area (m^2) and area-weighted centroids for GeoJSON polygons
+
+    Polygon and MultiPolygon geometries are supported; interior rings are
+    subtracted as holes. All rings are processed in a single vectorized
+    shoelace pass. Features that cannot be measured get NaN metrics and a
+    message in geometry_error instead of silently reporting zero.
+    """
+    n_features = len(geometries)
+    vertices, ring_starts, ring_feature, ring_is_hole, errors = flatten_rings(geometries)
+
+    area = np.zeros(n_features)
+    weighted_x = np.zeros(n_features)
+    weighted_y = np.zeros(n_features)
+
+    if len(ring_starts):
+        x, y = project_equal_area(vertices[:, 0], vertices[:, 1])
+
+        # Pair every vertex with the next one in its ring, wrapping at the
+        # end, so closed and unclosed rings are handled alike
+        ring_stops = np.append(ring_starts[1:], len(vertices))
+        next_idx = np.arange(1, len(vertices) + 1)
+        next_idx[ring_stops - 1] = ring_starts
+
+        cross = x * y[next_idx] - x[next_idx] * y
+        signed_area = np.add.reduceat(cross, ring_starts) / 2.0
+        sum_x = np.add.reduceat((x + x[next_idx]) * cross, ring_starts)
+        sum_y = np.add.reduceat((y + y[next_idx]) * cross, ring_starts)
+
+        # Ring centroids, then ring areas signed by role (holes negative)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            ring_cx = sum_x / (6.0 * signed_area)
+            ring_cy = sum_y / (6.0 * signed_area)
+        ring_area = np.where(ring_is_hole, -1.0, 1.0) * np.abs(signed_area)
+        degenerate = signed_area == 0
+        ring_cx[degenerate] = 0.0
+        ring_cy[degenerate] = 0.0
+
+        area = np.bincount(ring_feature, weights=ring_area, minlength=n_features)
+        weighted_x = np.bincount(ring_feature, weights=ring_area * ring_cx, minlength=n_features)
+        weighted_y = np.bincount(ring_feature, weights=ring_area * ring_cy, minlength=n_features)
+
+    # Features with no usable area are reported rather than given a 0 centroid
+    for feature_idx in np.flatnonzero(area <= 0):
+        errors.setdefault(int(feature_idx), "zero or negative area")
+    failed = np.zeros(n_features, dtype=bool)
+    failed[list(errors)] = True
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        center_x = weighted_x / area
+        center_y = weighted_y / area
+    center_lon, center_lat = unproject_equal_area(center_x, center_y)
+
+    area[failed] = np.nan
+    center_lon[failed] = np.nan
+    center_lat[failed] = np.nan
+
+    geometry_error = np.full(n_features, None, dtype=object)
+    for feature_idx, message in errors.items():
+        geometry_error[feature_idx] = message
+    if errors:
+        logger.warning(f"{len(errors)} of {n_features} geometries could not be measured")
+
+    return pd.DataFrame({
+        'area_sqm': area,
+        'center_lon': center_lon,
+        'center_lat': center_lat,
+        'geometry_error': geometry_error
+    })
@@ -1,21 +1,16 @@
 import pandas as pd
 import numpy as np
-from sklearn.neighbors import NearestNeighbors
-import logging
+from sklearn.neighbors import BallTree
+import argparse
 from pathlib import Path
 import time
+from pipeline_profiling import setup_logging, RunProfiler
 
 # Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("landuse_station_mapping.log"),
-        logging.StreamHandler()
-    ]
-)
-logger = logging.getLogger("landuse_station_mapping")
+logger = setup_logging("landuse_station_mapping", "landuse_station_mapping.log")
+profiler = RunProfiler("landuse_station_mapping")
 
+@profiler.timed
 def load_data():
     """Load rainfall and land use data"""
     try:
@@ -30,6 +25,11 @@ def load_data():
         landuse_df = pd.read_pickle('land_use_data.pkl')
         logger.info(f"Loaded {len(landuse_df)} land use areas")
         
+        # Areas whose center point could not be computed cannot be matched
+        if landuse_df[['center_lat', 'center_lon']].isna().any(axis=None):
+            landuse_df = landuse_df.dropna(subset=['center_lat', 'center_lon']).reset_index(drop=True)
+            logger.info(f"Kept {len(landuse_df)} land use areas with a valid center point")
+        
         # Print sample data for debugging
         logger.info(f"Rainfall data sample:\n{rainfall_df.head()}")
         logger.info(f"Land use data sample:\n{landuse_df.head()}")
@@ -40,79 +40,145 @@ def load_data():
         logger.error(f"Error loading data: {str(e)}")
         raise
 
-def create_landuse_station_mapping(rainfall_df, landuse_df, max_distance_km=20.0):
+# Inverse-distance weighting over the k nearest stations of each area
+IDW_NEIGHBOURS = 4
+IDW_POWER = 2
+# Areas closer than this to a station take the distance as this, so a station
+# inside an area dominates without an infinite weight
+IDW_MIN_DISTANCE_KM = 0.05
+EARTH_RADIUS_KM = 6371.0088
+# Areas interpolated per block, bounding the (areas x k x days) temporaries
+IDW_CHUNK_ROWS = 2000
+
+def station_neighbours(station_coords, landuse_coords, k=IDW_NEIGHBOURS, max_distance_km=20.0,
+                       power=IDW_POWER):
+    """Find the k nearest stations of every area in one batched haversine query
+
+    Returns (indices, distances_km, weights), each of shape (areas, k).
+    Stations further than max_distance_km get zero weight.
     """
-    Create mapping between land use areas and the nearest rainfall stations
+    k = min(k, len(station_coords))
+    tree = BallTree(np.radians(station_coords), metric='haversine')
+    distances, indices = tree.query(np.radians(landuse_coords), k=k)
+    distances_km = distances * EARTH_RADIUS_KM
+    weights = np.maximum(distances_km, IDW_MIN_DISTANCE_KM) ** -power
+    weights[distances_km > max_distance_km] = 0.0
+    return indices, distances_km, weights
+
+def idw_interpolate(station_values, indices, weights, chunk_rows=IDW_CHUNK_ROWS):
+    """Weighted sums of station values for every area, renormalized per column
+
+    station_values is (stations, days) with NaN for missing readings. For each
+    area and day the weights of the neighbours that did report are rescaled to
+    sum to one, so a missing station never reads as zero rainfall. Days on
+    which none of an area's neighbours reported stay NaN.
+    """
+    station_values = np.asarray(station_values, dtype=np.float32)
+    present = np.isfinite(station_values)
+    filled = np.where(present, station_values, 0.0).astype(np.float32)
+    present = present.astype(np.float32)
+    weights = weights.astype(np.float32)
+
+    result = np.empty((len(indices), station_values.shape[1]), dtype=np.float32)
+    for start in range(0, len(indices), chunk_rows):
+        stop = start + chunk_rows
+        block_indices = indices[start:stop]
+        block_weights = weights[start:stop]
+        numerator = np.einsum('pk,pkd->pd', block_weights, filled[block_indices])
+        denominator = np.einsum('pk,pkd->pd', block_weights, present[block_indices])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result[start:stop] = np.where(denominator > 0, numerator / denominator, np.nan)
+    return result
+
+@profiler.timed
+def create_landuse_station_mapping(rainfall_df, landuse_df, max_distance_km=20.0, k=IDW_NEIGHBOURS):
+    """
+    Create mapping between land use areas and their k nearest rainfall stations,
+    with rainfall scores interpolated by inverse distance weighting
     max_distance_km: Maximum distance in kilometers to consider for matching
     """
     try:
         start_time = time.time()
-        
-        # Prepare station coordinates
+
+        # Prepare station and land use coordinates as (lat, lon)
         station_coords = rainfall_df[['latitude', 'longitude']].values
-        logger.info(f"Prepared {len(station_coords)} station coordinates")
-        
-        # Prepare land use coordinates
         landuse_coords = landuse_df[['center_lat', 'center_lon']].values
-        logger.info(f"Prepared {len(landuse_coords)} land use coordinates")
-        
-        # Convert max_distance from km to degrees (approximate)
-        # 1 degree ≈ 111 km at the equator
-        max_distance_deg = max_distance_km / 111.0
-        
-        # Initialize NearestNeighbors
-        logger.info("Finding nearest rainfall stations for each land use area...")
-        nbrs = NearestNeighbors(n_neighbors=1, algorithm='ball_tree')
-        nbrs.fit(station_coords)
-        
-        # Find distances and indices of nearest neighbors
-        distances, indices = nbrs.kneighbors(landuse_coords)
-        logger.info(f"Found nearest neighbors. Shape of indices: {indices.shape}")
-        
-        # Convert distances to kilometers
-        distances_km = distances * 111.0
-        
-        # Flatten the arrays to ensure they match the length of landuse_df
-        indices_flat = indices.flatten()
-        distances_km_flat = distances_km.flatten()
-        
-        logger.info(f"Flattened arrays. Length of indices_flat: {len(indices_flat)}")
-        
-        # Create mapping DataFrame
-        logger.info("Creating mapping DataFrame...")
-        
-        # Get the station data for the matched indices
-        matched_stations = rainfall_df.iloc[indices_flat]
-        logger.info(f"Matched station data shape: {matched_stations.shape}")
-        
-        # Create the mapping DataFrame
+        logger.info(f"Prepared {len(station_coords)} station and {len(landuse_coords)} land use coordinates")
+
+        logger.info(f"Finding {k} nearest rainfall stations for each land use area...")
+        indices, distances_km, weights = station_neighbours(station_coords, landuse_coords, k, max_distance_km)
+
+        # One (stations x scores) matrix interpolated in a single pass
+        score_columns = ['total_rainfall', 'overall_rain_score']
+        scores = idw_interpolate(rainfall_df[score_columns].values, indices, weights)
+
+        # Nearest station kept for reference alongside the interpolated scores
+        nearest = rainfall_df.iloc[indices[:, 0]]
         mapping_df = pd.DataFrame({
             'landuse_name': landuse_df['name'].values,
             'landuse_lat': landuse_df['center_lat'].values,
             'landuse_lon': landuse_df['center_lon'].values,
             'landuse_type': landuse_df['lu_desc'].values,
-            'station_id': matched_stations['station_id'].values,
-            'station_name': matched_stations['station_name'].values,
-            'total_rainfall': matched_stations['total_rainfall'].values,
-            'overall_rain_score': matched_stations['overall_rain_score'].values,
-            'station_lat': matched_stations['latitude'].values,
-            'station_lon': matched_stations['longitude'].values,
-            'distance_km': distances_km_flat
+            'station_id': nearest['station_id'].values,
+            'station_name': nearest['station_name'].values,
+            'total_rainfall': scores[:, 0],
+            'overall_rain_score': scores[:, 1],
+            'station_lat': nearest['latitude'].values,
+            'station_lon': nearest['longitude'].values,
+            'distance_km': distances_km[:, 0],
+            'stations_used': (weights > 0).sum(axis=1)
         })
-        
-        # Filter out matches that are too far
-        mapping_df = mapping_df[mapping_df['distance_km'] <= max_distance_km]
-        
+
+        # Filter out areas with no station within range
+        mapping_df = mapping_df[mapping_df['stations_used'] > 0]
+
+        used = np.unique(indices[weights > 0])
         elapsed_time = time.time() - start_time
-        logger.info(f"Created mapping for {len(mapping_df)} land use areas in {elapsed_time:.2f} seconds")
+        logger.info(
+            f"Created mapping for {len(mapping_df)} land use areas from {len(used)} of "
+            f"{len(station_coords)} stations in {elapsed_time:.2f} seconds"
+        )
         return mapping_df
-    
+
     except Exception as e:
         logger.error(f"Error creating mapping: {str(e)}")
         import traceback
         logger.error(traceback.format_exc())
         raise
 
+@profiler.timed
+def interpolate_daily_rainfall(daily_df, landuse_df, value_column, max_distance_km=20.0, k=IDW_NEIGHBOURS):
+    """Interpolate the daily rainfall series of every land use area in one pass
+
+    Returns an (areas x days) float32 DataFrame indexed by land use name.
+    """
+    try:
+        # (stations x days) readings, NaN where a station did not report
+        readings = daily_df.pivot_table(
+            index='station_id', columns='day', values=value_column, aggfunc='mean'
+        )
+        station_coords = (
+            daily_df.groupby('station_id')[['latitude', 'longitude']].first().loc[readings.index]
+        )
+        logger.info(
+            f"Daily rainfall: {readings.shape[0]} stations x {readings.shape[1]} days, "
+            f"{readings.isna().to_numpy().mean():.1%} readings missing"
+        )
+
+        landuse_coords = landuse_df[['center_lat', 'center_lon']].values
+        indices, _, weights = station_neighbours(station_coords.values, landuse_coords, k, max_distance_km)
+        series = idw_interpolate(readings.to_numpy(), indices, weights)
+
+        daily_rainfall = pd.DataFrame(series, index=landuse_df['name'].values, columns=readings.columns)
+        daily_rainfall.index.name = 'landuse_name'
+        logger.info(f"Interpolated {daily_rainfall.shape[1]} days for {daily_rainfall.shape[0]} land use areas")
+        return daily_rainfall
+
+    except Exception as e:
+        logger.error(f"Error interpolating daily rainfall: {str(e)}")
+        raise
+
+@profiler.timed
 def save_mapping(mapping_df):
     """Save mapping to CSV and pickle files"""
     try:
@@ -134,16 +200,48 @@ def save_mapping(mapping_df):
         logger.error(f"Error saving mapping: {str(e)}")
         raise
 
+@profiler.timed
+def save_daily_rainfall(daily_rainfall):
+    """Save the interpolated daily rainfall series of every land use area"""
+    try:
+        output_dir = Path("landuse_station_mappings")
+        output_dir.mkdir(exist_ok=True)
+
+        pkl_path = output_dir / "landuse_daily_rainfall.pkl"
+        daily_rainfall.to_pickle(pkl_path)
+        logger.info(f"Saved daily rainfall series to {pkl_path}")
+
+    except Exception as e:
+        logger.error(f"Error saving daily rainfall: {str(e)}")
+        raise
+
 def main():
+    parser = argparse.ArgumentParser(description="Interpolate station rainfall onto land use areas")
+    parser.add_argument('--neighbours', type=int, default=IDW_NEIGHBOURS,
+                        help="nearest stations weighted per land use area")
+    parser.add_argument('--daily-rainfall', metavar='CSV',
+                        help="daily station readings (station_id, latitude, longitude, day, value) to interpolate")
+    parser.add_argument('--value-column', default='daily_rainfall',
+                        help="rainfall column of the --daily-rainfall file")
+    args = parser.parse_args()
+
     try:
         # Load data
         rainfall_df, landuse_df = load_data()
         
         # Create mapping
-        mapping_df = create_landuse_station_mapping(rainfall_df, landuse_df)
+        mapping_df = create_landuse_station_mapping(rainfall_df, landuse_df, k=args.neighbours)
         
         # Save mapping
         save_mapping(mapping_df)
+
+        # Full daily series for every area, when daily readings are given
+        if args.daily_rainfall:
+            daily_df = pd.read_csv(args.daily_rainfall)
+            daily_rainfall = interpolate_daily_rainfall(
+                daily_df, landuse_df, args.value_column, k=args.neighbours
+            )
+            save_daily_rainfall(daily_rainfall)
         
         # Print summary
         print("\nMapping Summary:")
@@ -162,4 +260,5 @@ def main():
         raise
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    with profiler:
+        main() 
\ No newline at end of file
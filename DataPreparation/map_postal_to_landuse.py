@@ -2,23 +2,20 @@ import pandas as pd
 import numpy as np
 from sklearn.neighbors import NearestNeighbors
 import pickle
-import logging
 import time
-from shapely.geometry import Point, Polygon
+import argparse
+from collections import Counter
+from shapely.geometry import Point
 from pathlib import Path
 import os
+from geometry_metrics import shape_from_coordinates
+from pipeline_profiling import setup_logging, RunProfiler
 
 # Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("postal_landuse_mapping.log"),
-        logging.StreamHandler()
-    ]
-)
-logger = logging.getLogger('postal_landuse_mapping')
+logger = setup_logging('postal_landuse_mapping', 'postal_landuse_mapping.log')
+profiler = RunProfiler('postal_landuse_mapping')
 
+@profiler.timed
 def load_data():
     """Load postal codes and land use data"""
     try:
@@ -31,25 +28,110 @@ def load_data():
             land_use_df = pickle.load(f)
         logger.info(f"Loaded {len(land_use_df)} land use areas")
         
+        # Areas whose center point could not be computed cannot be matched
+        if land_use_df[['center_lat', 'center_lon']].isna().any(axis=None):
+            land_use_df = land_use_df.dropna(subset=['center_lat', 'center_lon']).reset_index(drop=True)
+            logger.info(f"Kept {len(land_use_df)} land use areas with a valid center point")
+        
         return postal_df, land_use_df
     except Exception as e:
         logger.error(f"Error loading data: {str(e)}")
         raise
 
 def create_polygon(coordinates):
-    """Create a Shapely polygon from coordinates"""
-    # The coordinates are in the format [[[lon1, lat1, z1], [lon2, lat2, z2], ...]]
-    # We need to extract just the lon/lat pairs
-    coords = coordinates[0]  # Get the first (and only) polygon
-    # Extract just the lon/lat pairs (ignore the z coordinate)
-    coords_2d = [(coord[0], coord[1]) for coord in coords]
-    return Polygon(coords_2d)
+    """Create a Shapely Polygon or MultiPolygon, holes included, from GeoJSON coordinates"""
+    # The coordinates may carry a z value per vertex, which is dropped
+    return shape_from_coordinates(coordinates)
+
+def polygon_bounds(coordinates):
+    """Bounding box of an area's geometry, NaN if it cannot be read"""
+    try:
+        return create_polygon(coordinates).bounds
+    except Exception:
+        return (np.nan, np.nan, np.nan, np.nan)
+
+@profiler.timed
+def build_containment_index(land_use_df):
+    """Prepare bounding boxes and lazily-built polygons for containment tests"""
+    if {'min_lon', 'min_lat', 'max_lon', 'max_lat'}.issubset(land_use_df.columns):
+        bounds = land_use_df[['min_lon', 'min_lat', 'max_lon', 'max_lat']].to_numpy(dtype=float)
+    else:
+        # Older land_use_data.pkl without precomputed boxes
+        logger.info("Computing land use bounding boxes...")
+        bounds = np.array([
+            polygon_bounds(coords) for coords in land_use_df['coordinates']
+        ], dtype=float)
+    
+    # Areas whose geometry could not be read have no box to prefilter with
+    unbounded = int(np.isnan(bounds).any(axis=1).sum())
+    if unbounded:
+        logger.warning(f"{unbounded} land use areas have no bounding box and are tested exactly")
+    
+    has_simplified = 'simplified_coordinates' in land_use_df.columns
+    return {
+        'bounds': bounds,
+        'coordinates': land_use_df['coordinates'].to_numpy(),
+        'simplified_coordinates': (
+            land_use_df['simplified_coordinates'].to_numpy() if has_simplified else None
+        ),
+        'tolerance': (
+            land_use_df['simplify_tolerance'].to_numpy(dtype=float) if has_simplified else None
+        ),
+        'exact': {},
+        'simplified': {},
+        'stats': Counter()
+    }
+
+def polygon_contains(index, idx, point, use_prefilter=True):
+    """Test whether land use area idx contains point
+
+    With use_prefilter, points outside the bounding box are rejected
+    outright, and points further than twice the simplification tolerance
+    from the simplified boundary are decided on the simplified polygon.
+    Only points near an edge are tested against the exact polygon, as are
+    areas without a bounding box. Unreadable geometries contain nothing and
+    are counted as invalid_geometry.
+    """
+    stats = index['stats']
+    min_lon, min_lat, max_lon, max_lat = index['bounds'][idx]
+    if use_prefilter and not np.isnan(min_lon):
+        if not (min_lon <= point.x <= max_lon and min_lat <= point.y <= max_lat):
+            stats['bbox_rejected'] += 1
+            return False
+        
+        simplified_coords = (
+            index['simplified_coordinates'][idx]
+            if index['simplified_coordinates'] is not None else None
+        )
+        if simplified_coords:
+            if idx not in index['simplified']:
+                index['simplified'][idx] = create_polygon(simplified_coords)
+            simplified = index['simplified'][idx]
+            if simplified.boundary.distance(point) > 2 * index['tolerance'][idx]:
+                stats['simplified_decided'] += 1
+                return simplified.contains(point)
+    
+    if idx not in index['exact']:
+        try:
+            index['exact'][idx] = create_polygon(index['coordinates'][idx])
+        except Exception as e:
+            logger.warning(f"Land use area {idx} has an unreadable geometry: {str(e)}")
+            index['exact'][idx] = None
+    if index['exact'][idx] is None:
+        stats['invalid_geometry'] += 1
+        return False
+    stats['exact_tested'] += 1
+    return index['exact'][idx].contains(point)
 
-def find_nearest_landuse(postal_df, land_use_df, k=5):
+@profiler.timed
+def find_nearest_landuse(postal_df, land_use_df, k=5, use_prefilter=True, index=None):
     """Find the nearest land use area for each postal code"""
     logger.info("Starting nearest land use search...")
     start_time = time.time()
     
+    if index is None:
+        index = build_containment_index(land_use_df)
+    
     # Prepare the data
     postal_locations = postal_df[['lon', 'lat']].values
     landuse_locations = land_use_df[['center_lon', 'center_lat']].values
@@ -71,10 +153,8 @@ def find_nearest_landuse(postal_df, land_use_df, k=5):
         
         # Check each of the k nearest land use areas
         for rank, (idx, dist) in enumerate(zip(indices[i], distances[i]), 1):
-            land_use = land_use_df.iloc[idx]
-            polygon = create_polygon(land_use.coordinates)
-            
-            if polygon.contains(point):
+            if polygon_contains(index, idx, point, use_prefilter):
+                land_use = land_use_df.iloc[idx]
                 results.append({
                     'postal_code': postal_row.postal,
                     'postal_lat': postal_row.lat,
@@ -111,8 +191,38 @@ def find_nearest_landuse(postal_df, land_use_df, k=5):
             logger.info(f"Processed {i + 1} postal codes...")
     
     logger.info(f"Completed nearest land use search in {time.time() - start_time:.2f} seconds")
+    logger.info(f"Containment tests: {dict(index['stats'])}")
     return pd.DataFrame(results)
 
+def benchmark_containment(postal_df, land_use_df, sample_size):
+    """Compare exact-only and prefiltered containment on a sample of postal codes"""
+    sample = postal_df.sample(n=min(sample_size, len(postal_df)), random_state=0)
+    logger.info(f"Benchmarking containment on {len(sample)} postal codes...")
+    
+    # Fresh indexes so neither run benefits from polygons built by the other
+    start_time = time.time()
+    exact = find_nearest_landuse(sample, land_use_df, use_prefilter=False,
+                                 index=build_containment_index(land_use_df))
+    exact_time = time.time() - start_time
+    
+    start_time = time.time()
+    prefiltered = find_nearest_landuse(sample, land_use_df, use_prefilter=True,
+                                       index=build_containment_index(land_use_df))
+    prefiltered_time = time.time() - start_time
+    
+    mismatches = int((
+        (exact['landuse_name'].values != prefiltered['landuse_name'].values)
+        | (exact['is_contained'].values != prefiltered['is_contained'].values)
+    ).sum())
+    
+    logger.info("\nContainment Benchmark:")
+    logger.info(f"Exact polygons only: {exact_time:.2f} seconds")
+    logger.info(f"Bounding box + simplified prefilter: {prefiltered_time:.2f} seconds")
+    logger.info(f"Speedup: {exact_time / max(prefiltered_time, 1e-9):.2f}x")
+    logger.info(f"Mappings that differ: {mismatches} of {len(sample)} "
+                f"({mismatches / max(len(sample), 1) * 100:.2f}%)")
+
+@profiler.timed
 def save_results(results_df):
     """Save the results to CSV and pickle files"""
     output_dir = Path('postal_landuse_mappings')
@@ -154,11 +264,15 @@ def print_summary(results_df):
     logger.info("\nSample Mappings:")
     logger.info(results_df.head().to_string())
 
-def main():
+def main(benchmark_sample=None):
     try:
         # Load data
         postal_df, land_use_df = load_data()
         
+        if benchmark_sample:
+            benchmark_containment(postal_df, land_use_df, benchmark_sample)
+            return
+        
         # Find nearest land use areas
         results_df = find_nearest_landuse(postal_df, land_use_df)
         
@@ -173,4 +287,9 @@ def main():
         raise
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Map postal codes to land use areas')
+    parser.add_argument('--benchmark', type=int, metavar='N',
+                        help='compare exact and prefiltered containment on N sampled postal codes')
+    args = parser.parse_args()
+    with profiler:
+        main(args.benchmark) 
\ No newline at end of file
@@ -1,21 +1,15 @@
 import pandas as pd
 import numpy as np
 from sklearn.neighbors import NearestNeighbors
-import logging
 from pathlib import Path
 import time
+from pipeline_profiling import setup_logging, RunProfiler
 
 # Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("station_mapping.log"),
-        logging.StreamHandler()
-    ]
-)
-logger = logging.getLogger("station_mapping")
+logger = setup_logging("station_mapping", "station_mapping.log")
+profiler = RunProfiler("station_mapping")
 
+@profiler.timed
 def load_data():
     """Load rainfall and land use data"""
     try:
@@ -30,6 +24,11 @@ def load_data():
         landuse_df = pd.read_pickle('land_use_data.pkl')
         logger.info(f"Loaded {len(landuse_df)} land use areas")
         
+        # Areas whose center point could not be computed cannot be matched
+        if landuse_df[['center_lat', 'center_lon']].isna().any(axis=None):
+            landuse_df = landuse_df.dropna(subset=['center_lat', 'center_lon']).reset_index(drop=True)
+            logger.info(f"Kept {len(landuse_df)} land use areas with a valid center point")
+        
         # Print sample data for debugging
         logger.info(f"Rainfall data sample:\n{rainfall_df.head()}")
         logger.info(f"Land use data sample:\n{landuse_df.head()}")
@@ -40,6 +39,7 @@ def load_data():
         logger.error(f"Error loading data: {str(e)}")
         raise
 
+@profiler.timed
 def create_station_landuse_mapping(rainfall_df, landuse_df, max_distance_km=1.0):
     """
     Create mapping between stations and land use based on geographical proximity
@@ -110,6 +110,7 @@ def create_station_landuse_mapping(rainfall_df, landuse_df, max_distance_km=1.0)
         logger.error(traceback.format_exc())
         raise
 
+@profiler.timed
 def save_mapping(mapping_df):
     """Save mapping to CSV and pickle files"""
     try:
@@ -155,4 +156,5 @@ def main():
         raise
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    with profiler:
+        main() 
\ No newline at end of file
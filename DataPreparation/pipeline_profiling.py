@@ -0,0 +1,172 @@
+import json
+import logging
+import os
+import time
+import tracemalloc
+import functools
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+# Where JSON run reports and profiler dumps are written
+REPORT_DIR = Path(os.environ.get('PIPELINE_REPORT_DIR', 'run_reports'))
+# Optional profiler: 'cprofile' or 'pyinstrument'
+PROFILE_MODE = os.environ.get('PIPELINE_PROFILE', '').lower()
+# tracemalloc slows allocation-heavy code; set to 0 to skip memory tracking
+TRACK_MEMORY = os.environ.get('PIPELINE_TRACK_MEMORY', '1') != '0'
+
+def setup_logging(name, log_file):
+    """Configure the shared log format with a file and a console handler"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(log_file),
+            logging.StreamHandler()
+        ]
+    )
+    return logging.getLogger(name)
+
+class RunProfiler:
+    """Collect per-stage wall/CPU time and peak memory for one script run
+
+    Use as a context manager around the script's main() and decorate the
+    functions of interest with timed(), or wrap blocks in stage(). On exit
+    a JSON run report is written to REPORT_DIR.
+    """
+
+    def __init__(self, script_name):
+        self.script_name = script_name
+        self.logger = logging.getLogger(script_name)
+        self.stages = {}
+        self._stack = []
+        self._profiler = None
+        self._started_at = None
+
+    def timed(self, func):
+        """Decorator recording every call of func as a stage"""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with self.stage(func.__name__):
+                return func(*args, **kwargs)
+        return wrapper
+
+    @contextmanager
+    def stage(self, name):
+        """Record wall time, CPU time and peak traced memory of a block"""
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            # Peaks are tracked per frame: resetting for this stage would
+            # lose the parent's peak so far, so remember it on the stack
+            if self._stack:
+                self._stack[-1]['peak'] = max(self._stack[-1]['peak'], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        frame = {'peak': 0}
+        self._stack.append(frame)
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            self._stack.pop()
+            peak = max(frame['peak'], tracemalloc.get_traced_memory()[1]) if tracing else None
+            if tracing and self._stack:
+                self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak)
+
+            stats = self.stages.setdefault(name, {
+                'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'peak_memory_mb': None
+            })
+            stats['calls'] += 1
+            stats['wall_seconds'] += wall
+            stats['cpu_seconds'] += cpu
+            if peak is not None:
+                stats['peak_memory_mb'] = max(stats['peak_memory_mb'] or 0.0, peak / 1024 ** 2)
+
+    def _start_profiler(self):
+        if PROFILE_MODE == 'cprofile':
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        elif PROFILE_MODE == 'pyinstrument':
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                self.logger.warning("PIPELINE_PROFILE=pyinstrument but pyinstrument is not installed")
+                return
+            self._profiler = Profiler()
+            self._profiler.start()
+        elif PROFILE_MODE:
+            self.logger.warning(f"Unknown PIPELINE_PROFILE={PROFILE_MODE!r}, profiling disabled")
+
+    def _stop_profiler(self, stem):
+        """Stop the profiler and dump its output next to the run report"""
+        if self._profiler is None:
+            return None
+        if PROFILE_MODE == 'cprofile':
+            self._profiler.disable()
+            path = REPORT_DIR / f"{stem}.prof"
+            self._profiler.dump_stats(path)
+        else:
+            self._profiler.stop()
+            path = REPORT_DIR / f"{stem}.html"
+            path.write_text(self._profiler.output_html())
+        return str(path)
+
+    def __enter__(self):
+        self._started_at = datetime.now()
+        if TRACK_MEMORY and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self._start_profiler()
+        self._run_stage = self.stage('total')
+        self._run_stage.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self._run_stage.__exit__(exc_type, exc_value, tb)
+        REPORT_DIR.mkdir(exist_ok=True)
+        stem = f"{self.script_name}_{self._started_at:%Y%m%d_%H%M%S}"
+        profile_file = self._stop_profiler(stem)
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+        total = self.stages.pop('total')
+        report = {
+            'script': self.script_name,
+            'started_at': self._started_at.isoformat(),
+            'status': 'failed' if exc_type else 'success',
+            'error': f"{exc_type.__name__}: {exc_value}" if exc_type else None,
+            'wall_seconds': round(total['wall_seconds'], 3),
+            'cpu_seconds': round(total['cpu_seconds'], 3),
+            'peak_memory_mb': round(total['peak_memory_mb'], 2) if total['peak_memory_mb'] is not None else None,
+            'profile_file': profile_file,
+            'stages': {
+                name: {
+                    'calls': stats['calls'],
+                    'wall_seconds': round(stats['wall_seconds'], 3),
+                    'cpu_seconds': round(stats['cpu_seconds'], 3),
+                    'peak_memory_mb': (
+                        round(stats['peak_memory_mb'], 2) if stats['peak_memory_mb'] is not None else None
+                    )
+                }
+                for name, stats in self.stages.items()
+            }
+        }
+
+        report_path = REPORT_DIR / f"{stem}.json"
+        with open(report_path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+        self.logger.info(f"Run report for {self.script_name} ({report['status']}):")
+        for name, stats in report['stages'].items():
+            self.logger.info(
+                f"  {name}: {stats['calls']} call(s), {stats['wall_seconds']:.2f}s wall, "
+                f"{stats['cpu_seconds']:.2f}s CPU, peak {stats['peak_memory_mb']} MB"
+            )
+        self.logger.info(
+            f"  total: {report['wall_seconds']:.2f}s wall, {report['cpu_seconds']:.2f}s CPU, "
+            f"peak {report['peak_memory_mb']} MB"
+        )
+        self.logger.info(f"Saved run report to {report_path}")
+        return False
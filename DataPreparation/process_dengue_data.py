@@ -3,61 +3,121 @@ import numpy as np
 from pathlib import Path
 import glob
 from sklearn.neighbors import NearestNeighbors
-import logging
+import argparse
+import io
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from pipeline_profiling import setup_logging, RunProfiler
+from cluster_aggregates import (
+    recompute_aggregates, update_aggregates, check_consistency,
+    load_aggregates, save_aggregates
+)
 
 # Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("process_dengue_data.log"),
-        logging.StreamHandler()
-    ]
-)
-logger = logging.getLogger('process_dengue_data')
+logger = setup_logging('process_dengue_data', 'process_dengue_data.log')
+profiler = RunProfiler('process_dengue_data')
+
+# Column names for the dengue data
+CLUSTER_COLUMNS = [
+    'Number Of Cases',
+    'Street Address',
+    'Latitude',
+    'Longitude',
+    'Cluster Number',
+    'Recent Cases In Cluster',
+    'Total Cases In Cluster',
+    'Date',
+    'Month Number'
+]
+
+# Fixed schema of the cluster CSV files, so no file is type-inferred on its own.
+# Street Address is made categorical and Date parsed once all files are combined:
+# with one small file per day, doing either per file costs more than the read.
+# float32 resolves latitude near 1.3 deg to about 1.3 cm, but longitude near
+# 103.8 deg only to about 0.85 m, so longitude stays float64 for the haversine
+# address and proximity matching
+CLUSTER_DTYPES = {
+    'Number Of Cases': 'int32',
+    'Street Address': str,
+    'Latitude': 'float32',
+    'Longitude': 'float64',
+    'Cluster Number': str,
+    'Recent Cases In Cluster': 'int32',
+    'Total Cases In Cluster': 'int32',
+    'Date': str,
+    'Month Number': 'int16'
+}
+
+# Batches of files parsed concurrently; the C parser releases the GIL while tokenizing
+CSV_READ_WORKERS = int(os.environ.get('CSV_READ_WORKERS', min(8, os.cpu_count() or 1)))
+# The daily files are tiny, so each batch is parsed in one read_csv call to
+# amortize its fixed per-call cost
+CSV_FILES_PER_BATCH = 64
+
+OUTPUT_DIR = Path('dengue_data')
+# The API's forecasting script, rerun after an ingest so forecasts include the new day
+FORECASTING_SCRIPT = Path(os.environ.get(
+    'FORECASTING_SCRIPT',
+    Path(__file__).resolve().parent.parent / 'SystemCode' / 'backend' / 'forecasting.py'
+))
+
+def read_cluster_csvs(files):
+    """Read a batch of headerless cluster CSVs as one file with the fixed schema"""
+    buffer = io.BytesIO()
+    for file in files:
+        data = Path(file).read_bytes()
+        buffer.write(data)
+        if data and not data.endswith(b'\n'):
+            buffer.write(b'\n')
+    buffer.seek(0)
+    return pd.read_csv(buffer, names=CLUSTER_COLUMNS, dtype=CLUSTER_DTYPES, engine='c')
+
+def finish_cluster_frame(dengue_cluster):
+    """Convert the combined string columns to their final dtypes in place"""
+    # Categories are sorted, so sorting on addresses stays lexical
+    dengue_cluster['Street Address'] = dengue_cluster['Street Address'].astype('category')
+    dengue_cluster['Date'] = pd.to_datetime(dengue_cluster['Date'], format='%y%m%d')
+    return dengue_cluster
 
-def load_dengue_data():
+@profiler.timed
+def load_dengue_data(workers=CSV_READ_WORKERS):
     """Load and combine all dengue cluster CSV files"""
     logger.info("Loading dengue cluster data...")
-    
-    # Column names for the dengue data
-    columns = [
-        'Number Of Cases',
-        'Street Address',
-        'Latitude',
-        'Longitude',
-        'Cluster Number',
-        'Recent Cases In Cluster',
-        'Total Cases In Cluster',
-        'Date',
-        'Month Number'
-    ]
+    start_time = time.time()
     
     # Get all CSV files in the csv directory
-    csv_files = glob.glob('csv/*.csv')
+    csv_files = sorted(glob.glob('csv/*.csv'))
     logger.info(f"Found {len(csv_files)} CSV files")
     
-    # Read and combine all CSV files
-    dfs = []
-    for file in csv_files:
-        df = pd.read_csv(file, names=columns)
-        dfs.append(df)
+    # Read all CSV files in concurrent batches, in file order
+    batches = [
+        csv_files[start:start + CSV_FILES_PER_BATCH]
+        for start in range(0, len(csv_files), CSV_FILES_PER_BATCH)
+    ]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        dfs = list(executor.map(read_cluster_csvs, batches))
     
     # Combine all dataframes
-    dengue_cluster = pd.concat(dfs, ignore_index=True)
-    
-    # Convert Date to datetime
-    dengue_cluster['Date'] = pd.to_datetime(dengue_cluster['Date'], format='%y%m%d')
+    dengue_cluster = finish_cluster_frame(pd.concat(dfs, ignore_index=True))
+    del dfs
     
     # Sort the dataframe
     dengue_cluster = dengue_cluster.sort_values(
         by=['Date', 'Cluster Number', 'Street Address']
     ).reset_index(drop=True)
     
-    logger.info(f"Combined data has {len(dengue_cluster)} rows")
+    memory_mb = dengue_cluster.memory_usage(deep=True).sum() / 1024 ** 2
+    logger.info(
+        f"Combined data has {len(dengue_cluster)} rows, {memory_mb:.1f} MB, "
+        f"loaded in {time.time() - start_time:.2f}s with {workers} workers"
+    )
     return dengue_cluster
 
+@profiler.timed
 def create_address_mapping(dengue_cluster, postal_df):
     """Create mapping between street addresses and postal codes"""
     logger.info("Creating address to postal code mapping...")
@@ -94,10 +154,42 @@ def create_address_mapping(dengue_cluster, postal_df):
     logger.info("Address mapping created")
     return address_postal_code_mapping
 
-def main():
+@profiler.timed
+def build_date_index(dengue_cluster):
+    """Build a Date -> [start_row, stop_row) index over the date-sorted cluster table"""
+    dates = dengue_cluster['Date'].to_numpy()
+    unique_dates, start_rows = np.unique(dates, return_index=True)
+    stop_rows = np.append(start_rows[1:], len(dates))
+    return pd.DataFrame({
+        'Date': unique_dates,
+        'start_row': start_rows,
+        'stop_row': stop_rows
+    })
+
+@profiler.timed
+def save_month_partitions(dengue_cluster, output_dir):
+    """Save the date-sorted cluster table as one pickle per month"""
+    partition_dir = output_dir / 'dengue_cluster_by_month'
+    partition_dir.mkdir(exist_ok=True)
+    
+    # The table is sorted by Date, so every month is a contiguous row range
+    months = dengue_cluster['Date'].dt.to_period('M').to_numpy()
+    boundaries = np.flatnonzero(months[1:] != months[:-1]) + 1
+    starts = np.concatenate(([0], boundaries))
+    stops = np.concatenate((boundaries, [len(dengue_cluster)]))
+    
+    for start, stop in zip(starts, stops):
+        month = str(months[start])
+        dengue_cluster.iloc[start:stop].reset_index(drop=True).to_pickle(
+            partition_dir / f'{month}.pkl'
+        )
+    
+    logger.info(f"Saved {len(starts)} monthly partitions to {partition_dir}/")
+
+def main(workers=CSV_READ_WORKERS):
     try:
         # Load dengue cluster data
-        dengue_cluster = load_dengue_data()
+        dengue_cluster = load_dengue_data(workers)
         
         # Load postal code data
         logger.info("Loading postal code data...")
@@ -115,8 +207,12 @@ def main():
             how='left'
         )
         
+        # The left merge keeps row order, but make the Date ordering explicit
+        # since the date index and partitions below depend on it
+        dengue_cluster = dengue_cluster.sort_values('Date', kind='stable').reset_index(drop=True)
+        
         # Create output directory if it doesn't exist
-        output_dir = Path('dengue_data')
+        output_dir = OUTPUT_DIR
         output_dir.mkdir(exist_ok=True)
         
         # Save dengue cluster data
@@ -124,6 +220,17 @@ def main():
         dengue_cluster.to_csv(output_dir / 'dengue_cluster.csv', index=False)
         dengue_cluster.to_pickle(output_dir / 'dengue_cluster.pkl')
         
+        # Save monthly partitions and the date -> row range index
+        if not dengue_cluster.empty:
+            save_month_partitions(dengue_cluster, output_dir)
+        date_index = build_date_index(dengue_cluster)
+        date_index.to_csv(output_dir / 'dengue_cluster_date_index.csv', index=False)
+        date_index.to_pickle(output_dir / 'dengue_cluster_date_index.pkl')
+        logger.info(f"Indexed {len(date_index)} distinct dates")
+        
+        # Rebuild the incremental aggregate store from the full table
+        save_aggregates(recompute_aggregates(dengue_cluster))
+        
         # Save address mapping
         logger.info("Saving address mapping...")
         address_postal_code_mapping.to_csv(output_dir / 'address_postal_code_mapping.csv', index=False)
@@ -141,5 +248,108 @@ def main():
         logger.error(f"Error in main: {str(e)}")
         raise
 
+@profiler.timed
+def append_cluster_rows(new_rows, output_dir=OUTPUT_DIR):
+    """Append ingested rows to the saved cluster table, its month partitions and date index"""
+    # Map addresses not seen before to their nearest postal code, as main does
+    address_postal_code_mapping = pd.read_pickle(output_dir / 'address_postal_code_mapping.pkl')
+    unseen = new_rows[~new_rows['Street Address'].isin(address_postal_code_mapping['Street Address'])]
+    if not unseen.empty:
+        postal_df = pd.read_csv('SG_postal.csv')
+        address_postal_code_mapping = pd.concat(
+            [address_postal_code_mapping, create_address_mapping(unseen, postal_df)],
+            ignore_index=True
+        )
+        address_postal_code_mapping.to_csv(output_dir / 'address_postal_code_mapping.csv', index=False)
+        address_postal_code_mapping.to_pickle(output_dir / 'address_postal_code_mapping.pkl')
+    new_rows = new_rows.merge(
+        address_postal_code_mapping[['Street Address', 'postal_code']],
+        on='Street Address',
+        how='left'
+    )
+    
+    dengue_cluster = pd.concat(
+        [pd.read_pickle(output_dir / 'dengue_cluster.pkl'), new_rows], ignore_index=True
+    )
+    # Concatenating categoricals with different categories falls back to object
+    dengue_cluster['Street Address'] = dengue_cluster['Street Address'].astype(str).astype('category')
+    dengue_cluster = dengue_cluster.sort_values('Date', kind='stable').reset_index(drop=True)
+    dengue_cluster.to_csv(output_dir / 'dengue_cluster.csv', index=False)
+    dengue_cluster.to_pickle(output_dir / 'dengue_cluster.pkl')
+    
+    # Only the months the new rows fall in need their partition rewritten
+    months = dengue_cluster['Date'].dt.to_period('M')
+    save_month_partitions(
+        dengue_cluster[months.isin(new_rows['Date'].dt.to_period('M'))], output_dir
+    )
+    date_index = build_date_index(dengue_cluster)
+    date_index.to_csv(output_dir / 'dengue_cluster_date_index.csv', index=False)
+    date_index.to_pickle(output_dir / 'dengue_cluster_date_index.pkl')
+    logger.info(f"Appended {len(new_rows)} rows, cluster table now has {len(dengue_cluster)} rows")
+
+@profiler.timed
+def refresh_forecasts(cluster_path=OUTPUT_DIR / 'dengue_cluster.pkl'):
+    """Regenerate the API's forecasts from the pipeline's cluster table"""
+    if not FORECASTING_SCRIPT.exists():
+        logger.warning(f"{FORECASTING_SCRIPT} not found, forecasts were not refreshed")
+        return
+    # Run from the backend directory, next to combined_data.pkl, so forecasts.pkl
+    # is written where the API reads it; the API reloads it once it changes
+    subprocess.run(
+        [sys.executable, str(FORECASTING_SCRIPT), '--cluster-table', str(Path(cluster_path).resolve())],
+        cwd=FORECASTING_SCRIPT.parent,
+        check=True
+    )
+    logger.info("Refreshed forecasts")
+
+@profiler.timed
+def ingest_daily_file(csv_file, verify=False, workers=CSV_READ_WORKERS, forecast=True):
+    """Fold a single new daily cluster CSV into the pipeline's outputs and refresh forecasts
+
+    The aggregate store and dengue_data/ cluster table are updated here, not
+    the API's combined_data.pkl, so the API keeps recomputing its totals from
+    its own cluster table until the next full run rebuilds both together.
+    """
+    try:
+        logger.info(f"Ingesting {csv_file}...")
+        new_rows = finish_cluster_frame(read_cluster_csvs([csv_file]))
+        
+        # Rejects dates already ingested before anything is written
+        aggregates = load_aggregates()
+        update_aggregates(aggregates, new_rows)
+        append_cluster_rows(new_rows)
+        save_aggregates(aggregates)
+        logger.info(f"Folded {len(new_rows)} rows into the aggregate store")
+        
+        if forecast:
+            refresh_forecasts()
+        
+        # Optionally compare against a full recompute over every CSV file,
+        # which should include the file just ingested
+        if verify:
+            mismatches = check_consistency(aggregates, load_dengue_data(workers))
+            for mismatch in mismatches[:20]:
+                logger.warning(mismatch)
+        
+    except Exception as e:
+        logger.error(f"Error ingesting {csv_file}: {str(e)}")
+        raise
+
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Process dengue cluster data')
+    parser.add_argument('--ingest', metavar='CSV',
+                        help='fold a single new daily cluster CSV into the aggregate store')
+    parser.add_argument('--verify', action='store_true',
+                        help='with --ingest, check the aggregate store against a full recompute')
+    parser.add_argument('--workers', type=int, default=CSV_READ_WORKERS,
+                        help='CSV files read concurrently')
+    parser.add_argument('--no-forecast', action='store_true',
+                        help='with --ingest, do not regenerate the API forecasts')
+    args = parser.parse_args()
+    
+    with profiler:
+        if args.ingest:
+            ingest_daily_file(args.ingest, verify=args.verify, workers=args.workers,
+                              forecast=not args.no_forecast)
+        else:
+            main(args.workers) 
\ No newline at end of file
@@ -1,9 +1,21 @@
 import json
+import argparse
+import io
 import pandas as pd
 import numpy as np
-from shapely.geometry import Polygon
+import shapely
+from shapely.geometry import mapping
 from bs4 import BeautifulSoup
 from tqdm import tqdm
+import time
+from geometry_metrics import compute_geometry_metrics, shape_from_coordinates
+from pipeline_profiling import setup_logging, RunProfiler
+
+# Default tolerance (in degrees, ~1.1 m) for the simplified polygon geometry
+SIMPLIFY_TOLERANCE = 1e-5
+
+logger = setup_logging('process_land_use_data', 'process_land_use_data.log')
+profiler = RunProfiler('process_land_use_data')
 
 def extract_table_data(description):
     """Extract all fields from the HTML table in description"""
@@ -20,42 +32,43 @@ def extract_table_data(description):
     except:
         return {}
 
-def calculate_polygon_area(coordinates):
-    """Calculate area of polygon in square meters"""
-    try:
-        # Extract only longitude and latitude from coordinates (ignore z-coordinate)
-        coords_2d = [(coord[0], coord[1]) for coord in coordinates[0]]
-        polygon = Polygon(coords_2d)
-        # Rough conversion from degrees to meters at Singapore's latitude
-        # 1 degree = approximately 111,000 meters
-        area_in_degrees = polygon.area
-        area_in_meters = area_in_degrees * (111000 ** 2)
-        return area_in_meters
-    except:
-        return 0.0
+def calculate_bbox_and_simplified(coordinates, tolerance):
+    """Calculate the bounding box and a topology-preserving simplified geometry of an area
 
-def calculate_center_point(coordinates):
-    """Calculate center point of polygon"""
+    Polygons and MultiPolygons are handled alike, holes included. Returns
+    (bbox, simplified coordinates, (full, simplified) vertex counts, error);
+    areas that cannot be read get a NaN bbox, no simplified geometry, zero
+    vertices and the error message.
+    """
     try:
-        # Extract only longitude and latitude from coordinates (ignore z-coordinate)
-        coords_2d = [(coord[0], coord[1]) for coord in coordinates[0]]
-        polygon = Polygon(coords_2d)
-        centroid = polygon.centroid
-        return centroid.x, centroid.y
-    except:
-        return 0.0, 0.0
+        polygon = shape_from_coordinates(coordinates)
+        if polygon.is_empty:
+            raise ValueError("empty geometry")
+        simplified = polygon.simplify(tolerance, preserve_topology=True)
+        vertices = shapely.get_num_coordinates([polygon, simplified])
+        return polygon.bounds, mapping(simplified)['coordinates'], tuple(int(v) for v in vertices), None
+    except Exception as e:
+        return (np.nan, np.nan, np.nan, np.nan), None, (0, 0), str(e)
 
-def process_geojson(file_path):
+@profiler.timed
+def process_geojson(file_path, simplify_tolerance=SIMPLIFY_TOLERANCE):
     """Process GeoJSON file and return DataFrame"""
-    print(f"Loading GeoJSON file: {file_path}")
+    logger.info(f"Loading GeoJSON file: {file_path}")
     with open(file_path) as f:
         data = json.load(f)
     
     features = data['features']
-    print(f"Number of features in GeoJSON: {len(features)}")
+    logger.info(f"Number of features in GeoJSON: {len(features)}")
+    
+    # Calculate area and center point for every polygon in one vectorized pass
+    start_time = time.time()
+    with profiler.stage('compute_geometry_metrics'):
+        metrics = compute_geometry_metrics([feature['geometry'] for feature in features])
+    logger.info(f"Computed area and center point for {len(metrics)} geometries "
+                f"in {time.time() - start_time:.2f} seconds")
     
     rows = []
-    for feature in tqdm(features, desc="Processing features"):
+    for i, feature in enumerate(tqdm(features, desc="Processing features")):
         properties = feature['properties']
         geometry = feature['geometry']
         
@@ -65,9 +78,11 @@ def process_geojson(file_path):
         # Extract all fields from the description table
         table_data = extract_table_data(properties.get('Description', ''))
         
-        # Calculate area and center point
-        area = calculate_polygon_area(geometry['coordinates'])
-        center_lon, center_lat = calculate_center_point(geometry['coordinates'])
+        # Bounding box for cheap containment prefilters, plus a simplified
+        # geometry for tests that are not close to the polygon edge
+        bbox, simplified, vertices, shape_error = calculate_bbox_and_simplified(
+            geometry['coordinates'], simplify_tolerance
+        )
         
         # Create row with all extracted data
         row = {
@@ -79,9 +94,19 @@ def process_geojson(file_path):
             'gpr_b_mn': table_data.get('GPR_B_MN', ''),
             'inc_crc': table_data.get('INC_CRC', ''),
             'fmel_upd_d': table_data.get('FMEL_UPD_D', ''),
-            'area_sqm': area,
-            'center_lon': center_lon,
-            'center_lat': center_lat,
+            'area_sqm': metrics.at[i, 'area_sqm'],
+            'center_lon': metrics.at[i, 'center_lon'],
+            'center_lat': metrics.at[i, 'center_lat'],
+            'geometry_error': metrics.at[i, 'geometry_error'],
+            'min_lon': bbox[0],
+            'min_lat': bbox[1],
+            'max_lon': bbox[2],
+            'max_lat': bbox[3],
+            'simplify_tolerance': simplify_tolerance,
+            'simplified_coordinates': simplified,
+            'vertices': vertices[0],
+            'simplified_vertices': vertices[1],
+            'shape_error': shape_error,
             'coordinates': geometry['coordinates']  # Store the full coordinates
         }
         
@@ -90,30 +115,52 @@ def process_geojson(file_path):
     df = pd.DataFrame(rows)
     return df
 
-def main():
+def main(simplify_tolerance=SIMPLIFY_TOLERANCE):
     # File paths
     geojson_file = "MasterPlan2019LandUselayer.geojson"
     output_file = "land_use_data.pkl"
     
     # Process GeoJSON and create DataFrame
-    df = process_geojson(geojson_file)
+    df = process_geojson(geojson_file, simplify_tolerance)
     
     # Display DataFrame info and sample
-    print("\nDataFrame Info:")
-    print(df.info())
-    print("\nFirst 5 rows:")
-    print(df.head())
-    print("\nSummary statistics for area_sqm:")
-    print(df['area_sqm'].describe())
+    info = io.StringIO()
+    df.info(buf=info)
+    logger.info(f"DataFrame Info:\n{info.getvalue()}")
+    logger.info(f"First 5 rows:\n{df.head()}")
+    logger.info(f"Summary statistics for area_sqm:\n{df['area_sqm'].describe()}")
+    
+    # Display geometries whose area or center point could not be computed
+    failed = df[df['geometry_error'].notna()]
+    logger.info(f"Geometries that could not be measured: {len(failed)}")
+    if not failed.empty:
+        logger.info(f"\n{failed[['name', 'geometry_error']].head(10)}")
     
     # Display unique land use descriptions
-    print("\nUnique land use descriptions:")
-    print(df['lu_desc'].value_counts().head(10))
+    logger.info(f"Unique land use descriptions:\n{df['lu_desc'].value_counts().head(10)}")
+    
+    # Display geometries with no bounding box or simplified geometry
+    unshaped = df[df['shape_error'].notna()]
+    logger.info(f"Geometries that could not be simplified: {len(unshaped)}")
+    if not unshaped.empty:
+        logger.info(f"\n{unshaped[['name', 'shape_error']].head(10)}")
+    
+    # Display how much the simplified geometry saves
+    full_vertices = int(df['vertices'].sum())
+    simplified_vertices = int(df['simplified_vertices'].sum())
+    logger.info(f"Simplified geometry at tolerance {simplify_tolerance}: "
+                f"{simplified_vertices} of {full_vertices} vertices kept "
+                f"({simplified_vertices / max(full_vertices, 1) * 100:.1f}%)")
     
     # Save DataFrame to pickle file
-    print(f"\nSaving DataFrame to {output_file}")
+    logger.info(f"Saving DataFrame to {output_file}")
     df.to_pickle(output_file)
-    print("Done!")
+    logger.info("Done!")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Process the MasterPlan land use layer')
+    parser.add_argument('--simplify-tolerance', type=float, default=SIMPLIFY_TOLERANCE,
+                        help='tolerance in degrees for the simplified polygon geometry')
+    args = parser.parse_args()
+    with profiler:
+        main(args.simplify_tolerance) 
\ No newline at end of file
@@ -0,0 +1,137 @@
+import pandas as pd
+import numpy as np
+import pickle
+import logging
+import os
+import time
+
+logger = logging.getLogger("cluster_proximity")
+
+# Search radii around each postal code, and trailing date windows (in days,
+# ending at the latest cluster date) whose clusters are counted
+PROXIMITY_RADII_M = (200, 500, 1000)
+PROXIMITY_WINDOWS_DAYS = (1, 14)
+# Radius and window reported as nearby_clusters / total_cases by /predict
+DEFAULT_RADIUS_M = 500
+DEFAULT_WINDOW_DAYS = 1
+
+EARTH_RADIUS_M = 6371008.8
+CLUSTER_PROXIMITY_PATH = os.environ.get("CLUSTER_PROXIMITY_PATH", "cluster_proximity.pkl")
+
+
+def proximity_column(kind: str, radius_m: int, window_days: int) -> str:
+    """Column name for a count, e.g. clusters_500m_1d or cases_1000m_14d"""
+    return f"{kind}_{radius_m}m_{window_days}d"
+
+
+def window_cases(dengue_cluster: pd.DataFrame, end_date, window_days: int) -> pd.DataFrame:
+    """Latest record of every cluster address reported in the trailing window
+
+    Clusters are re-reported daily, so only the last report of each address
+    counts towards the window instead of one row per day.
+    """
+    dates = dengue_cluster["Date"]
+    in_window = (dates > end_date - pd.Timedelta(days=window_days)) & (dates <= end_date)
+    frame = dengue_cluster.loc[
+        in_window, ["Date", "Cluster Number", "Street Address", "Latitude", "Longitude", "Number Of Cases"]
+    ]
+    frame = frame.dropna(subset=["Latitude", "Longitude"])
+    return frame.sort_values("Date", kind="stable").drop_duplicates(
+        ["Cluster Number", "Street Address"], keep="last"
+    )
+
+
+def count_within_radius(tree, query_points: np.ndarray, radius_m: float,
+                        cluster_codes: np.ndarray, cases: np.ndarray):
+    """Distinct clusters and summed cases within radius_m of every query point"""
+    n_points = len(query_points)
+    neighbours = tree.query_radius(query_points, r=radius_m / EARTH_RADIUS_M)
+    sizes = np.fromiter((len(idx) for idx in neighbours), dtype=np.int64, count=n_points)
+    if sizes.sum() == 0:
+        return np.zeros(n_points, dtype=np.int32), np.zeros(n_points, dtype=np.int32)
+
+    point_idx = np.repeat(np.arange(n_points), sizes)
+    case_idx = np.concatenate(neighbours)
+    case_sums = np.bincount(point_idx, weights=cases[case_idx], minlength=n_points)
+    # A cluster spans several addresses; count each one once per point
+    n_clusters = int(cluster_codes.max()) + 1
+    pairs = np.unique(point_idx * n_clusters + cluster_codes[case_idx])
+    cluster_counts = np.bincount(pairs // n_clusters, minlength=n_points)
+    return cluster_counts.astype(np.int32), case_sums.astype(np.int32)
+
+
+def build_cluster_proximity(all_data: dict) -> dict:
+    """Count nearby clusters and cases for every postal code at every radius and window"""
+    from sklearn.neighbors import BallTree
+
+    start_time = time.time()
+    dengue_cluster = all_data["dengue_cluster"]
+    postal_mapping = all_data["postal_landuse_mapping"].drop_duplicates("postal_code")
+    postal_mapping = postal_mapping.dropna(subset=["postal_lat", "postal_lon"]).sort_values("postal_code")
+    query_points = np.radians(postal_mapping[["postal_lat", "postal_lon"]].to_numpy(dtype=np.float64))
+    end_date = dengue_cluster["Date"].max()
+
+    columns = {}
+    for window_days in PROXIMITY_WINDOWS_DAYS:
+        cases = window_cases(dengue_cluster, end_date, window_days)
+        if cases.empty:
+            zeros = np.zeros(len(query_points), dtype=np.int32)
+            for radius_m in PROXIMITY_RADII_M:
+                columns[proximity_column("clusters", radius_m, window_days)] = zeros
+                columns[proximity_column("cases", radius_m, window_days)] = zeros
+            continue
+
+        cluster_points = np.radians(cases[["Latitude", "Longitude"]].to_numpy(dtype=np.float64))
+        tree = BallTree(cluster_points, metric="haversine")
+        cluster_codes, _ = pd.factorize(cases["Cluster Number"])
+        case_counts = cases["Number Of Cases"].to_numpy(dtype=np.float64)
+        for radius_m in PROXIMITY_RADII_M:
+            cluster_counts, case_sums = count_within_radius(
+                tree, query_points, radius_m, cluster_codes, case_counts
+            )
+            columns[proximity_column("clusters", radius_m, window_days)] = cluster_counts
+            columns[proximity_column("cases", radius_m, window_days)] = case_sums
+
+    logger.info(
+        f"Counted clusters near {len(query_points)} postal codes at {len(PROXIMITY_RADII_M)} radii x "
+        f"{len(PROXIMITY_WINDOWS_DAYS)} windows in {time.time() - start_time:.2f} seconds"
+    )
+    return {
+        "as_of": pd.Timestamp(end_date).strftime("%Y-%m-%d") if pd.notna(end_date) else None,
+        "radii_m": list(PROXIMITY_RADII_M),
+        "windows_days": list(PROXIMITY_WINDOWS_DAYS),
+        "postal_code": postal_mapping["postal_code"].to_numpy(dtype=np.int64),
+        "columns": columns,
+    }
+
+
+def proximity_for_postal_code(proximity: dict, postal_code: int):
+    """Every proximity count for one postal code, or None if it was not scored"""
+    postal_codes = proximity["postal_code"]
+    idx = np.searchsorted(postal_codes, postal_code)
+    if idx == len(postal_codes) or postal_codes[idx] != postal_code:
+        return None
+    return {name: int(values[idx]) for name, values in proximity["columns"].items()}
+
+
+def save_cluster_proximity(proximity: dict, path: str = CLUSTER_PROXIMITY_PATH) -> None:
+    """Write the proximity table atomically"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(proximity, f)
+    os.replace(tmp_path, path)
+
+
+def main():
+    with open("combined_data.pkl", "rb") as f:
+        all_data = pickle.load(f)
+    all_data["dengue_cluster"]["Date"] = pd.to_datetime(all_data["dengue_cluster"]["Date"])
+
+    proximity = build_cluster_proximity(all_data)
+    save_cluster_proximity(proximity)
+    logger.info(f"Saved cluster proximity as of {proximity['as_of']} to {CLUSTER_PROXIMITY_PATH}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,103 @@
+import pandas as pd
+import pickle
+import argparse
+import json
+import logging
+import time
+import orjson
+from fastapi.responses import Response
+
+logger = logging.getLogger("fast_json")
+
+# NumPy arrays and scalars and non-string dict keys are encoded natively
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _default(value):
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content) -> bytes:
+    """Encode content to JSON bytes with orjson (NaN becomes null)"""
+    return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+
+
+class PreSerializedResponse(Response):
+    """JSON response that sends already-encoded bytes as they are
+
+    Endpoints returning a Response bypass FastAPI's response_model validation
+    and jsonable_encoder, so this is only for trusted, internally built data.
+    """
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
+
+
+def frame_records(frame: pd.DataFrame) -> list:
+    """Rows of frame as dicts, built column by column from plain Python values"""
+    columns = list(frame.columns)
+    values = [frame[column].tolist() for column in columns]
+    return [dict(zip(columns, row)) for row in zip(*values)]
+
+
+def benchmark_serialization(frame: pd.DataFrame, repeats: int = 20) -> dict:
+    """Time the previous encode path (to_dict + jsonable_encoder + json) against frame_records + orjson"""
+    from fastapi.encoders import jsonable_encoder
+
+    def stdlib():
+        content = {"status": "success", "records": frame.to_dict(orient="records")}
+        return json.dumps(jsonable_encoder(content), ensure_ascii=False, separators=(",", ":")).encode()
+
+    def fast():
+        return dumps({"status": "success", "records": frame_records(frame)})
+
+    timings = {}
+    for name, encode in (("stdlib", stdlib), ("orjson", fast)):
+        encode()
+        start = time.perf_counter()
+        for _ in range(repeats):
+            body = encode()
+        timings[name] = {
+            "ms_per_call": round((time.perf_counter() - start) / repeats * 1000, 3),
+            "bytes": len(body),
+        }
+    timings["speedup"] = round(timings["stdlib"]["ms_per_call"] / timings["orjson"]["ms_per_call"], 1)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JSON encoding of cluster records")
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    with open("combined_data.pkl", "rb") as f:
+        all_data = pickle.load(f)
+    dengue_cluster = all_data["dengue_cluster"].copy()
+    dengue_cluster["Date"] = pd.to_datetime(dengue_cluster["Date"])
+
+    # The /clusters/latest payload, and a larger slice of raw history
+    latest = (
+        dengue_cluster.sort_values("Date", ascending=False)
+        .groupby("Cluster Number")
+        .first()
+        .reset_index()
+    )
+    history = dengue_cluster.tail(50000)
+    for name, frame in (("latest clusters", latest), ("history tail", history)):
+        frame = frame.assign(Date=frame["Date"].astype(str))
+        timings = benchmark_serialization(frame, args.repeats)
+        logger.info(
+            f"{name} ({len(frame)} rows): stdlib {timings['stdlib']['ms_per_call']} ms, "
+            f"orjson {timings['orjson']['ms_per_call']} ms ({timings['speedup']}x), "
+            f"{timings['orjson']['bytes']} bytes"
+        )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
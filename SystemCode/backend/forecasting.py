@@ -0,0 +1,197 @@
+import pandas as pd
+import numpy as np
+import pickle
+import argparse
+import logging
+import os
+import time
+
+logger = logging.getLogger("forecasting")
+
+# Forecast 1..FORECAST_HORIZON weeks ahead
+FORECAST_HORIZON = 4
+# Number of weekly lags and rolling-mean windows used as features
+CASE_LAGS = 4
+ROLLING_WINDOWS = (4, 8)
+
+FORECASTS_PATH = os.environ.get("FORECASTS_PATH", "forecasts.pkl")
+LANDUSE_STATION_MAPPING_PATH = os.environ.get(
+    "LANDUSE_STATION_MAPPING_PATH", "landuse_station_mapping.pkl"
+)
+
+
+def postal_sector(postal_codes: pd.Series) -> pd.Series:
+    """Singapore postal sector (first two digits) of each postal code"""
+    codes = pd.to_numeric(postal_codes, errors="coerce")
+    return (codes // 10000).astype("Int64").astype(str).str.zfill(2).where(codes.notna())
+
+
+def assign_regions(dengue_cluster: pd.DataFrame, address_postal_code_mapping: pd.DataFrame) -> pd.Series:
+    """Region (postal sector) of every cluster row, NaN where the address is unmapped"""
+    if "postal_code" in dengue_cluster.columns:
+        postal_codes = dengue_cluster["postal_code"]
+    else:
+        lookup = address_postal_code_mapping.drop_duplicates("Street Address").set_index("Street Address")
+        postal_codes = dengue_cluster["Street Address"].map(lookup["postal_code"])
+    return postal_sector(postal_codes)
+
+
+def weekly_case_matrix(dengue_cluster: pd.DataFrame, regions: pd.Series):
+    """Average daily case load per region and week as a (regions x weeks) matrix"""
+    known = regions.notna()
+    frame = pd.DataFrame({
+        "region": regions[known].to_numpy(),
+        "date": dengue_cluster.loc[known, "Date"].to_numpy(),
+        "cases": dengue_cluster.loc[known, "Number Of Cases"].to_numpy(dtype=np.float64),
+    })
+    daily = frame.groupby(["region", "date"])["cases"].sum().reset_index()
+    daily["week"] = daily["date"].dt.to_period("W").dt.start_time
+    weekly = daily.groupby(["region", "week"])["cases"].mean().unstack("week")
+
+    # Weeks with no cluster rows for a region had no active cases there
+    if weekly.shape[1]:
+        all_weeks = pd.date_range(weekly.columns.min(), weekly.columns.max(), freq="7D")
+        weekly = weekly.reindex(columns=all_weeks)
+    weekly = weekly.fillna(0.0)
+    return weekly.to_numpy(), weekly.index, weekly.columns
+
+
+def region_rain_scores(postal_mapping: pd.DataFrame, landuse_station_mapping, regions) -> np.ndarray:
+    """Mean station rain score of the land-use areas in each region (0 when unavailable)"""
+    if landuse_station_mapping is None or landuse_station_mapping.empty:
+        return np.zeros(len(regions))
+    rain_by_landuse = landuse_station_mapping.groupby("landuse_name")["overall_rain_score"].mean()
+    rain = postal_mapping["landuse_name"].map(rain_by_landuse)
+    by_region = rain.groupby(postal_sector(postal_mapping["postal_code"])).mean()
+    return by_region.reindex(regions).fillna(0.0).to_numpy()
+
+
+def shift_weeks(matrix: np.ndarray, lag: int) -> np.ndarray:
+    """Shift a (regions x weeks) matrix forward in time by lag weeks, padding with NaN"""
+    shifted = np.full_like(matrix, np.nan)
+    if lag < matrix.shape[1]:
+        shifted[:, lag:] = matrix[:, :matrix.shape[1] - lag]
+    return shifted
+
+
+def rolling_mean(matrix: np.ndarray, window: int) -> np.ndarray:
+    """Trailing rolling mean along the week axis, NaN until the window is full"""
+    cumsum = np.concatenate([np.zeros((matrix.shape[0], 1)), np.cumsum(matrix, axis=1)], axis=1)
+    result = np.full_like(matrix, np.nan)
+    if window <= matrix.shape[1]:
+        result[:, window - 1:] = (cumsum[:, window:] - cumsum[:, :-window]) / window
+    return result
+
+
+def build_features(log_cases: np.ndarray, rain: np.ndarray, weeks: pd.DatetimeIndex) -> np.ndarray:
+    """Stack lag, rolling, rainfall and seasonal features into a (regions x weeks x features) array"""
+    n_regions, n_weeks = log_cases.shape
+    week_of_year = np.asarray(weeks.isocalendar().week, dtype=np.float64)
+    season = 2 * np.pi * week_of_year / 52.0
+
+    layers = [shift_weeks(log_cases, lag) for lag in range(CASE_LAGS)]
+    layers += [rolling_mean(log_cases, window) for window in ROLLING_WINDOWS]
+    layers.append(np.broadcast_to(rain[:, None], (n_regions, n_weeks)))
+    layers.append(np.broadcast_to(np.sin(season)[None, :], (n_regions, n_weeks)))
+    layers.append(np.broadcast_to(np.cos(season)[None, :], (n_regions, n_weeks)))
+    return np.stack(layers, axis=2)
+
+
+def build_forecasts(all_data: dict, landuse_station_mapping=None) -> dict:
+    """Fit one multi-output model on all regions and forecast every region in one pass"""
+    start_time = time.time()
+    dengue_cluster = all_data["dengue_cluster"]
+    regions = assign_regions(dengue_cluster, all_data["address_postal_code_mapping"])
+    cases, region_index, weeks = weekly_case_matrix(dengue_cluster, regions)
+    n_regions, n_weeks = cases.shape
+    if n_weeks == 0:
+        raise ValueError("No dengue cluster history to forecast from")
+
+    log_cases = np.log1p(cases)
+    rain = region_rain_scores(all_data["postal_landuse_mapping"], landuse_station_mapping, region_index)
+    features = build_features(log_cases, rain, weeks)
+
+    # Targets for every horizon at once: y[r, t, h - 1] = log cases at t + h
+    targets = np.stack(
+        [shift_weeks(log_cases[:, ::-1], h)[:, ::-1] for h in range(1, FORECAST_HORIZON + 1)],
+        axis=2,
+    )
+
+    X = features.reshape(-1, features.shape[2])
+    y = targets.reshape(-1, FORECAST_HORIZON)
+    usable = np.isfinite(X).all(axis=1) & np.isfinite(y).all(axis=1)
+
+    latest_features = features[:, -1, :]
+    if usable.sum() > X.shape[1] and np.isfinite(latest_features).all():
+        from sklearn.linear_model import Ridge
+
+        model = Ridge(alpha=1.0).fit(X[usable], y[usable])
+        predicted = np.expm1(model.predict(latest_features)).clip(min=0)
+        method = "ridge"
+    else:
+        # Too little history for lag/rolling features: carry the last week forward
+        logger.warning(f"Only {n_weeks} weeks of history, using persistence forecasts")
+        predicted = np.repeat(cases[:, -1:], FORECAST_HORIZON, axis=1)
+        method = "persistence"
+
+    last_week = weeks[-1]
+    forecast_weeks = [last_week + pd.Timedelta(weeks=h) for h in range(1, FORECAST_HORIZON + 1)]
+    logger.info(
+        f"Forecast {n_regions} regions x {FORECAST_HORIZON} weeks ({method}, "
+        f"{int(usable.sum())} training samples) in {time.time() - start_time:.2f} seconds"
+    )
+    return {
+        "generated_at": pd.Timestamp.now().isoformat(),
+        "method": method,
+        "last_observed_week": last_week.strftime("%Y-%m-%d"),
+        "forecast_weeks": [week.strftime("%Y-%m-%d") for week in forecast_weeks],
+        "regions": list(region_index),
+        "last_observed_cases": np.round(cases[:, -1], 2),
+        "predicted_cases": np.round(predicted, 2),
+    }
+
+
+def load_landuse_station_mapping(path: str = LANDUSE_STATION_MAPPING_PATH):
+    """Load the land-use to rainfall station mapping if it is deployed with the API"""
+    if not os.path.exists(path):
+        logger.info(f"{path} not found, forecasts will not use rainfall features")
+        return None
+    return pd.read_pickle(path)
+
+
+def save_forecasts(forecasts: dict, path: str = FORECASTS_PATH) -> None:
+    """Write forecasts atomically so the API never reads a partial file"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(forecasts, f)
+    os.replace(tmp_path, path)
+
+
+def load_history(cluster_table_path: str = None) -> dict:
+    """combined_data.pkl, optionally with its cluster table replaced by a newer one"""
+    with open("combined_data.pkl", "rb") as f:
+        all_data = pickle.load(f)
+    if cluster_table_path is not None:
+        # The pipeline's table, which `process_dengue_data.py --ingest` keeps
+        # current, already carries the postal code of every row
+        all_data["dengue_cluster"] = pd.read_pickle(cluster_table_path)
+    all_data["dengue_cluster"]["Date"] = pd.to_datetime(all_data["dengue_cluster"]["Date"])
+    return all_data
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute case forecasts for every region")
+    parser.add_argument("--cluster-table",
+                        help="cluster history to forecast from instead of the one in combined_data.pkl, "
+                             "e.g. the pipeline's dengue_data/dengue_cluster.pkl")
+    parser.add_argument("--output", default=FORECASTS_PATH)
+    args = parser.parse_args()
+
+    forecasts = build_forecasts(load_history(args.cluster_table), load_landuse_station_mapping())
+    save_forecasts(forecasts, args.output)
+    logger.info(f"Saved forecasts to {args.output}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -1,20 +1,193 @@
-from fastapi import FastAPI, HTTPException
+import time
+
+# Process start, for the startup timeline
+_startup_clock = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager, contextmanager
+import asyncio
 import pandas as pd
 import numpy as np
 import pickle
-import folium
-from pydantic import BaseModel
-from typing import Dict, Any
+from pydantic import BaseModel, StringConstraints
+from typing import Dict, Any, Iterator, Optional
+from typing_extensions import Annotated
+from datetime import date
+import io
+import itertools
+import json
 import os
+import threading
 import traceback
 import logging
+import warnings
+from risk_grid import (
+    LOW_RISK_THRESHOLD, HIGH_RISK_THRESHOLD, RISK_GRID_PATH, build_risk_grid, first_landuse_rows
+)
+from map_tiles import (
+    TILE_MIN_ZOOM, TILE_MAX_ZOOM, ensure_tile, load_landuse, prepare_layers, remove_stale_tile_versions
+)
+from forecasting import FORECASTS_PATH, build_forecasts, load_landuse_station_mapping
+from cluster_proximity import (
+    CLUSTER_PROXIMITY_PATH, DEFAULT_RADIUS_M, DEFAULT_WINDOW_DAYS,
+    build_cluster_proximity, proximity_column, proximity_for_postal_code
+)
+from traffic_replay import RECORD_HEADER, format_record
+from fast_json import PreSerializedResponse, dumps, frame_records
+from single_flight import SingleFlight
+from map_store import MAP_STORE_GC_INTERVAL_SECONDS, MapStore
+from model_training import (
+    MODEL_PATH, build_feature_matrix, check_model_manifest, file_sha256, load_manifest,
+    model_feature_order
+)
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Dengue Outbreak Prediction API")
+# /predict passes schema-ordered NumPy rows to a model fitted on a DataFrame;
+# the order is checked once at startup, so skip sklearn's per-call warning
+warnings.filterwarnings("ignore", message="X does not have valid feature names")
+
+# Load artifacts in a background thread so the server accepts connections
+# (and answers /healthz) immediately; set to 0 to load before serving
+BACKGROUND_STARTUP = os.environ.get("BACKGROUND_STARTUP", "1") != "0"
+# How often to check for a forecasts file rewritten by forecasting.py
+FORECAST_RELOAD_INTERVAL_SECONDS = int(os.environ.get("FORECAST_RELOAD_INTERVAL_SECONDS", "60"))
+
+# Startup progress, reported by /readyz; "disabled" maps each optional phase
+# that failed to its error
+startup_state = {"status": "starting", "error": None, "phases": [], "disabled": {}}
+
+
+@contextmanager
+def startup_phase(name: str):
+    """Time one startup phase and add it to the startup timeline"""
+    start = time.perf_counter()
+    yield
+    elapsed = time.perf_counter() - start
+    startup_state["phases"].append({"phase": name, "seconds": round(elapsed, 3)})
+    logger.info(f"Startup phase '{name}' took {elapsed:.2f}s")
+
+
+def optional_phase(name: str, load):
+    """Run a startup phase whose failure only disables the endpoints built on it"""
+    try:
+        with startup_phase(name):
+            return load()
+    except Exception as e:
+        startup_state["disabled"][name] = str(e)
+        logger.error(f"Startup phase '{name}' failed, its endpoints are disabled: {str(e)}")
+        logger.error(traceback.format_exc())
+        return None
+
+
+def loaded(artifact, phase: str):
+    """Return an artifact built at startup, or answer 503 if its phase failed"""
+    if artifact is None:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Unavailable because startup phase '{phase}' failed.",
+        )
+    return artifact
+
+
+startup_state["phases"].append(
+    {"phase": "imports", "seconds": round(time.perf_counter() - _startup_clock, 3)}
+)
+
+
+async def collect_map_garbage_periodically():
+    """Enforce the map store limits every MAP_STORE_GC_INTERVAL_SECONDS"""
+    while True:
+        try:
+            await run_in_threadpool(map_store.collect_garbage)
+        except Exception as e:
+            logger.error(f"Map store garbage collection failed: {str(e)}")
+            logger.error(traceback.format_exc())
+        await asyncio.sleep(MAP_STORE_GC_INTERVAL_SECONDS)
+
+
+async def reload_forecasts_periodically():
+    """Pick up forecasts rewritten after an ingest every FORECAST_RELOAD_INTERVAL_SECONDS"""
+    while True:
+        await asyncio.sleep(FORECAST_RELOAD_INTERVAL_SECONDS)
+        if startup_state["status"] != "ready":
+            continue
+        try:
+            await run_in_threadpool(reload_forecasts_if_changed)
+        except Exception as e:
+            logger.error(f"Reloading forecasts failed: {str(e)}")
+            logger.error(traceback.format_exc())
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if BACKGROUND_STARTUP:
+        threading.Thread(target=load_artifacts, name="load-artifacts", daemon=True).start()
+    else:
+        load_artifacts()
+        # Loading before serving: fail startup so the process is restarted
+        if startup_state["status"] == "failed":
+            raise RuntimeError(f"Failed to load artifacts: {startup_state['error']}")
+    map_gc_task = asyncio.create_task(collect_map_garbage_periodically())
+    forecast_reload_task = asyncio.create_task(reload_forecasts_periodically())
+    yield
+    map_gc_task.cancel()
+    forecast_reload_task.cancel()
+
+
+app = FastAPI(title="Dengue Outbreak Prediction API", lifespan=lifespan)
+
+# Paths served while artifacts are still loading
+ALWAYS_AVAILABLE_PATHS = {"/healthz", "/readyz", "/docs", "/redoc", "/openapi.json"}
+
+
+# Registered before CORS so CORS headers are added to these 503s too
+@app.middleware("http")
+async def reject_until_ready(request: Request, call_next):
+    if startup_state["status"] != "ready" and request.url.path not in ALWAYS_AVAILABLE_PATHS:
+        if startup_state["status"] == "failed":
+            return JSONResponse(
+                status_code=503,
+                content={"detail": "The service failed to start and needs a restart."},
+            )
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "The service is starting up, please retry shortly."},
+            headers={"Retry-After": "5"},
+        )
+    return await call_next(request)
+
+
+# When set, every request is appended to this file for traffic_replay.py
+ACCESS_RECORD_PATH = os.environ.get("ACCESS_RECORD_PATH")
+_access_record = None
+if ACCESS_RECORD_PATH:
+    _write_header = not os.path.exists(ACCESS_RECORD_PATH)
+    _access_record = open(ACCESS_RECORD_PATH, "a", buffering=1)
+    if _write_header:
+        _access_record.write(RECORD_HEADER)
+
+
+@app.middleware("http")
+async def record_access(request: Request, call_next):
+    # Health probes and docs are not part of the traffic worth replaying
+    if _access_record is not None and request.url.path not in ALWAYS_AVAILABLE_PATHS:
+        postal_code = ""
+        if request.method == "POST" and request.url.path == "/predict":
+            try:
+                postal_code = str(json.loads(await request.body()).get("postal_code", "")).strip()
+            except Exception:
+                postal_code = ""
+        _access_record.write(format_record(
+            time.time(), request.method, request.url.path, request.url.query, postal_code
+        ))
+    return await call_next(request)
+
 
 # Enable CORS
 app.add_middleware(
@@ -53,17 +226,334 @@ def load_data():
         raise
 
 
-try:
-    all_data, data, model = load_data()
+# Loaded data, model and the indexes derived from them; set by load_artifacts
+all_data = data = model = None
+model_manifest = None
+# Checksum of the model file, keying caches of anything scored with the model
+model_sha256 = None
+# Model inputs in training column order, one row per row of data, and the
+# (row, response features) of the first data row for each landuse type
+feature_order = []
+feature_matrix = np.zeros((0, 0), dtype=np.float32)
+landuse_feature_rows = {}
+valid_postal_codes = frozenset()
+cluster_dates = np.array([], dtype="datetime64[ns]")
+monthly_cases = None
+risk_grid_layer = None
+cluster_proximity = None
+# Encoded bodies of responses that only depend on the loaded artifacts
+response_bodies = {}
+# Concurrent identical requests share one computation
+single_flight = SingleFlight()
+# Rendered risk maps, bounded in size and age by a background GC task
+map_store = MapStore()
+tile_layers = None
+forecast_state = {"mtime": None, "forecasts": None}
+
+
+def cluster_date_range(start_date=None, end_date=None) -> slice:
+    """Return the row slice of dengue_cluster with start_date <= Date <= end_date"""
+    start = 0
+    stop = len(cluster_dates)
+    if start_date is not None:
+        start = int(np.searchsorted(cluster_dates, pd.Timestamp(start_date).to_datetime64(), side="left"))
+    if end_date is not None:
+        stop = int(np.searchsorted(cluster_dates, pd.Timestamp(end_date).to_datetime64(), side="right"))
+    return slice(start, max(start, stop))
+
+
+def latest_cluster_date_range() -> slice:
+    """Return the row slice of dengue_cluster holding the most recent date"""
+    if len(cluster_dates) == 0:
+        return slice(0, 0)
+    return cluster_date_range(cluster_dates[-1], cluster_dates[-1])
+
+
+# dengue_data/cluster_aggregates.pkl from the same full pipeline run as combined_data.pkl
+CLUSTER_AGGREGATES_PATH = os.environ.get("CLUSTER_AGGREGATES_PATH", "cluster_aggregates.pkl")
+
+
+def load_monthly_cases() -> pd.DataFrame:
+    """Monthly case totals from the pipeline's aggregate store, or one groupby here if absent or stale
+
+    The store is only usable when it comes from the same full pipeline run as
+    the cluster table in combined_data.pkl. `--ingest` advances the store but
+    not combined_data.pkl, so after an ingest it is rejected here until the
+    next full rebuild.
+    """
+    latest_date = pd.Timestamp(cluster_dates[-1]).strftime("%Y-%m-%d") if len(cluster_dates) else None
+    if os.path.exists(CLUSTER_AGGREGATES_PATH):
+        with open(CLUSTER_AGGREGATES_PATH, "rb") as f:
+            aggregates = pickle.load(f)
+        # The store is only used when it covers exactly the loaded cluster table
+        if aggregates.get("last_date") == latest_date:
+            monthly = aggregates["monthly_cases"]
+            logger.info(f"Loaded monthly case totals from {CLUSTER_AGGREGATES_PATH}")
+            return pd.DataFrame(
+                {"Month": list(monthly.keys()), "Number Of Cases": list(monthly.values())}
+            ).sort_values("Month").reset_index(drop=True)
+        logger.info(
+            f"{CLUSTER_AGGREGATES_PATH} is as of {aggregates.get('last_date')}, "
+            f"recomputing monthly totals for {latest_date}"
+        )
+
+    dengue_cluster_data = all_data["dengue_cluster"]
+    monthly_cases = (
+        dengue_cluster_data.groupby(dengue_cluster_data["Date"].dt.to_period("M"))["Number Of Cases"]
+        .sum()
+        .rename_axis("Month")
+        .reset_index()
+    )
+    monthly_cases["Month"] = monthly_cases["Month"].astype(str)
+    return monthly_cases
+
+
+def load_risk_grid_layer() -> Dict[str, Any]:
+    """Load the precomputed island-wide risk grid (or build it) as a JSON-ready layer"""
+    grid = None
+    if os.path.exists(RISK_GRID_PATH):
+        with open(RISK_GRID_PATH, "rb") as f:
+            grid = pickle.load(f)
+        if grid.get("model_sha256") == model_sha256:
+            logger.info(f"Loaded risk grid from {RISK_GRID_PATH}")
+        else:
+            logger.info(f"{RISK_GRID_PATH} was scored with another model, rebuilding it")
+            grid = None
+    if grid is None:
+        grid = build_risk_grid(all_data, data, feature_matrix, model, model_sha256)
+
+    tiles = []
+    for (tile_y, tile_x), columns in sorted(grid["tiles"].items()):
+        tiles.append({
+            "tile": [tile_y, tile_x],
+            "postal_code": columns["postal_code"].tolist(),
+            "lat": np.round(columns["lat"].astype(np.float64), 5).tolist(),
+            "lon": np.round(columns["lon"].astype(np.float64), 5).tolist(),
+            "prediction": np.round(columns["prediction"].astype(np.float64), 3).tolist(),
+            "risk_code": columns["risk_code"].tolist(),
+        })
+
+    return {
+        "status": "success",
+        "tile_size_deg": grid["tile_size_deg"],
+        "origin_lat": grid["origin_lat"],
+        "origin_lon": grid["origin_lon"],
+        "risk_levels": grid["risk_levels"],
+        "thresholds": grid["thresholds"],
+        "tiles": tiles,
+    }
+
+
+def load_cluster_proximity() -> Dict[str, Any]:
+    """Load the nearby-cluster counts per postal code, rebuilding them if they are stale"""
+    latest_date = pd.Timestamp(cluster_dates[-1]).strftime("%Y-%m-%d") if len(cluster_dates) else None
+    if os.path.exists(CLUSTER_PROXIMITY_PATH):
+        with open(CLUSTER_PROXIMITY_PATH, "rb") as f:
+            proximity = pickle.load(f)
+        if proximity["as_of"] == latest_date:
+            logger.info(f"Loaded cluster proximity from {CLUSTER_PROXIMITY_PATH}")
+            return proximity
+        logger.info(f"{CLUSTER_PROXIMITY_PATH} is as of {proximity['as_of']}, rebuilding for {latest_date}")
+    return build_cluster_proximity(all_data)
+
+
+def cached_body(name: str, build) -> bytes:
+    """Encoded body of a response that only depends on the loaded artifacts, built once"""
+    body = response_bodies.get(name)
+    if body is None:
+        body = dumps(build())
+        response_bodies[name] = body
+    return body
+
+
+async def cached_response(name: str, build) -> PreSerializedResponse:
+    """Serve a cached body; concurrent requests arriving before it exists share one build"""
+    body = response_bodies.get(name)
+    if body is None:
+        body = await single_flight.run(name, None, cached_body, name, build)
+    return PreSerializedResponse(body)
+
+
+# Tiles only change when the data version does, which is part of the cache path
+TILE_CACHE_MAX_AGE = int(os.environ.get("TILE_CACHE_MAX_AGE", "86400"))
+
+
+def load_forecasts() -> Dict[str, Any]:
+    """Load precomputed forecasts, or forecast from all_data if none were written yet"""
+    if os.path.exists(FORECASTS_PATH):
+        with open(FORECASTS_PATH, "rb") as f:
+            forecasts = pickle.load(f)
+        logger.info(f"Loaded forecasts from {FORECASTS_PATH}")
+        return forecasts
+    return build_forecasts(all_data, load_landuse_station_mapping())
+
+
+def forecasts_mtime() -> Optional[float]:
+    return os.path.getmtime(FORECASTS_PATH) if os.path.exists(FORECASTS_PATH) else None
+
+
+def reload_forecasts_if_changed() -> None:
+    """Reload forecasts when forecasting.py has written a new file since the last load"""
+    global forecast_state
+    mtime = forecasts_mtime()
+    if mtime is None or mtime == forecast_state["mtime"]:
+        return
+    try:
+        forecasts = load_forecasts()
+    except Exception:
+        # Keep serving the previous forecasts until the file changes again
+        forecast_state = {"mtime": mtime, "forecasts": forecast_state["forecasts"]}
+        raise
+    # Replaced in one assignment, so requests never see a half-updated state
+    forecast_state = {"mtime": mtime, "forecasts": forecasts}
+
+
+def load_artifacts() -> None:
+    """Load data and model and build every derived index, recording a startup timeline
+
+    Data, model, feature matrix and the postal code and date indexes are
+    required, so any failure there fails startup. The derived layers after
+    them are optional: a failure is logged and only disables their endpoints.
+    """
+    global all_data, data, model, model_manifest, model_sha256, valid_postal_codes, cluster_dates
+    global feature_order, feature_matrix, landuse_feature_rows
+    global monthly_cases, risk_grid_layer, tile_layers, forecast_state, cluster_proximity
+    global response_bodies
 
-except Exception as e:
-    logger.error(f"Failed to load data: {str(e)}")
-    logger.error(traceback.format_exc())
-    raise HTTPException(status_code=500, detail="Failed to load model data")
+    startup_state["status"] = "loading"
+    start = time.perf_counter()
+    try:
+        with startup_phase("load data and model"):
+            all_data, data, model = load_data()
+
+        # Refuse to serve a model whose manifest does not match the loaded
+        # pickle, feature columns or risk thresholds
+        with startup_phase("model manifest"):
+            model_manifest = load_manifest()
+            if model_manifest is None:
+                logger.warning("No model manifest found, serving an unversioned model unchecked")
+            else:
+                check_model_manifest(model_manifest, model, data)
+                logger.info(f"Model {model_manifest['version']} matches its manifest")
+            # The manifest checksum was just verified against the model file
+            model_sha256 = model_manifest["model_sha256"] if model_manifest else file_sha256(MODEL_PATH)
+
+        # Convert the feature rows once, in the model's column order, so
+        # predictions slice a row instead of building a DataFrame per request
+        with startup_phase("feature matrix"):
+            feature_order = model_feature_order(model, data, model_manifest)
+            feature_matrix = build_feature_matrix(data, feature_order, model)
+            response_columns = data.columns.drop(['total_cases', 'postal_code'])
+            landuse_rows = first_landuse_rows(data, all_data['postal_landuse_mapping']['landuse_type'].unique())
+            landuse_feature_rows = {
+                landuse_type: (row, data[response_columns].iloc[row].to_dict())
+                for landuse_type, row in landuse_rows.items()
+            }
+            logger.info(
+                f"Built {feature_matrix.shape[0]}x{feature_matrix.shape[1]} feature matrix "
+                f"for {len(landuse_feature_rows)} landuse types"
+            )
+
+        # Every postal code the API can answer for, so unknown codes are rejected
+        # with a set lookup instead of a scan over the mapping DataFrame
+        with startup_phase("postal code index"):
+            valid_postal_codes = frozenset(
+                all_data['postal_landuse_mapping']['postal_code'].astype(int).tolist()
+            )
+            logger.info(f"Indexed {len(valid_postal_codes)} valid postal codes")
+
+        # Parse cluster dates once and keep the history sorted by date, so date
+        # lookups are binary searches over the Date column instead of full scans
+        with startup_phase("cluster date index"):
+            all_data["dengue_cluster"]["Date"] = pd.to_datetime(all_data["dengue_cluster"]["Date"])
+            if not all_data["dengue_cluster"]["Date"].is_monotonic_increasing:
+                all_data["dengue_cluster"] = (
+                    all_data["dengue_cluster"].sort_values("Date", kind="stable").reset_index(drop=True)
+                )
+            cluster_dates = all_data["dengue_cluster"]["Date"].to_numpy()
+
+        cluster_proximity = optional_phase("cluster proximity", load_cluster_proximity)
+        monthly_cases = optional_phase("monthly aggregates", load_monthly_cases)
+        risk_grid_layer = optional_phase("risk grid", load_risk_grid_layer)
+
+        # Geometry, cluster and risk layers that map tiles are cut from
+        def load_tile_layers():
+            layers = prepare_layers(all_data, data, feature_matrix, model, model_sha256, load_landuse())
+            remove_stale_tile_versions(layers["version"])
+            return layers
+
+        tile_layers = optional_phase("map tile layers", load_tile_layers)
+
+        # Left empty on failure, so a forecasts file written later is still picked up
+        forecast_state = optional_phase(
+            "forecasts", lambda: {"mtime": forecasts_mtime(), "forecasts": load_forecasts()}
+        ) or {"mtime": None, "forecasts": None}
+
+        # Encode the artifact-only responses now so no request pays for it
+        with startup_phase("response bodies"):
+            response_bodies = {}
+            for name, build in RESPONSE_BUILDERS.items():
+                try:
+                    cached_body(name, build)
+                except Exception as e:
+                    logger.warning(f"Could not pre-serialize {name}, it will be built on request: {str(e)}")
+
+        startup_state["status"] = "ready"
+        logger.info(f"Startup complete in {time.perf_counter() - start:.2f}s, ready to serve")
+
+    except Exception as e:
+        startup_state["status"] = "failed"
+        startup_state["error"] = str(e)
+        logger.error(f"Failed to load data: {str(e)}")
+        logger.error(traceback.format_exc())
+
+
+@app.get("/healthz")
+async def healthz():
+    # Liveness: the process is up, unless loading failed and it can only
+    # answer 503s; failing the probe gets it restarted
+    if startup_state["status"] == "failed":
+        return JSONResponse(
+            status_code=503,
+            content={"status": "failed", "error": startup_state["error"]},
+        )
+    return {"status": "alive"}
+
+
+@app.get("/readyz")
+async def readyz():
+    body = {
+        "status": startup_state["status"],
+        "error": startup_state["error"],
+        "model_version": model_manifest["version"] if model_manifest else None,
+        "phases": startup_state["phases"],
+        "disabled": startup_state["disabled"],
+    }
+    return JSONResponse(status_code=200 if startup_state["status"] == "ready" else 503, content=body)
+
+
+@app.get("/metrics")
+async def metrics():
+    return {"request_coalescing": single_flight.report(), "map_store": map_store.stats()}
+
+
+# Only every Nth rejected request is logged so bursts of junk input stay cheap
+REJECTION_LOG_SAMPLE_RATE = int(os.environ.get("REJECTION_LOG_SAMPLE_RATE", "100"))
+_rejection_counter = itertools.count()
+
+
+def log_rejection_sampled(message: str) -> None:
+    """Log a rejected request at WARNING, sampled to one in REJECTION_LOG_SAMPLE_RATE"""
+    count = next(_rejection_counter)
+    if count % max(REJECTION_LOG_SAMPLE_RATE, 1) == 0:
+        logger.warning(f"{message} (rejections so far: {count + 1})")
 
 
 class PostalCodeRequest(BaseModel):
-    postal_code: str
+    # Singapore postal codes are exactly six digits; anything else is a 422
+    postal_code: Annotated[
+        str, StringConstraints(strip_whitespace=True, pattern=r"^[0-9]{6}$")
+    ]
 
     class Config:
         schema_extra = {"postal_code": "520234"}
@@ -95,7 +585,7 @@ class PredictionResponse(BaseModel):
                     "humidity_score": 8.5,
                     "rainfall_score": 7.2,
                 },
-                "map_file": "static/risk_map_123456.html",
+                "map_file": "static/maps/3f/3f2a9c0d5e8b41a7c6d9e0f1a2b3c4d5.html",
                 "location_info": {
                     "latitude": 1.3521,
                     "longitude": 103.8198,
@@ -112,122 +602,148 @@ class PredictionResponse(BaseModel):
 
 def get_risk_level(prediction: float) -> str:
     """Determine risk level based on prediction value thresholds"""
-    if prediction < 1.044:
+    if prediction < LOW_RISK_THRESHOLD:
         return "Low"
-    elif prediction < 3.273:
+    elif prediction < HIGH_RISK_THRESHOLD:
         return "Medium"
     else:
         return "High"
 
 
-@app.post("/predict", response_model=PredictionResponse)
-async def predict_risk(request: PostalCodeRequest):
-    try:
-        postal_code = str(request.postal_code).strip()
-        logger.info(f"Processing prediction request for postal code: {postal_code}")
+def render_risk_map(latitude: float, longitude: float, popup_content: str, risk_color: str) -> str:
+    """Render the single-marker risk map as standalone HTML"""
+    # Create map (folium is only imported once the first map is drawn)
+    import folium
 
-        # Search for record in the postal_landuse_mapping
-        postal_records = all_data['postal_landuse_mapping'][
-            all_data['postal_landuse_mapping']['postal_code'] == int(postal_code)
-        ]
+    m = folium.Map(location=[latitude, longitude], zoom_start=15)
+    popup = folium.Popup(popup_content, max_width=300, show=True)  # Adjust max_width as needed
 
-        if postal_records.empty:
-            raise HTTPException(
-                status_code=404, 
-                detail=f"Postal code {postal_code} is not valid"
-            )
+    # Add marker with the custom popup
+    folium.Marker(
+        [latitude, longitude],
+        popup=popup,
+        icon=folium.Icon(
+            color=risk_color
+        )
+    ).add_to(m)
+    return m.get_root().render()
 
-        postal_info = postal_records.iloc[0]
-        landuse_type = postal_info['landuse_type']
 
-        address_postal_code_mapping_data = all_data['address_postal_code_mapping'][
-            all_data['address_postal_code_mapping']['postal_code'] == int(postal_code)
-        ]
+def compute_prediction(postal_code: str) -> bytes:
+    """Predict risk for a known postal code, draw its map and encode the response"""
+    logger.info(f"Processing prediction request for postal code: {postal_code}")
 
-        if address_postal_code_mapping_data.empty:
-            street_address = "Unknown"
-        else:
-            address_postal_code_mapping_data = address_postal_code_mapping_data.iloc[0]
-            street_address = address_postal_code_mapping_data.get('Street Address', '').title()
+    # Search for record in the postal_landuse_mapping
+    postal_records = all_data['postal_landuse_mapping'][
+        all_data['postal_landuse_mapping']['postal_code'] == int(postal_code)
+    ]
 
-        # Get corresponding record from data using landuse type
-        landuse_columns = data.columns.intersection([landuse_type])
-        if not landuse_columns.empty:
-            matching_data = data[data[landuse_columns[0]] == 1]
-        else:
-            matching_data = pd.DataFrame()  # Empty DataFrame for unknown landuse types
+    postal_info = postal_records.iloc[0]
+    landuse_type = postal_info['landuse_type']
 
-        if matching_data.empty:
-            raise HTTPException(
-            status_code=404,
-            detail=f"No matching data found for landuse type: {landuse_type}"
-            )
+    address_postal_code_mapping_data = all_data['address_postal_code_mapping'][
+        all_data['address_postal_code_mapping']['postal_code'] == int(postal_code)
+    ]
 
-        # Get features for prediction using the first matching record
-        features = matching_data.drop(['total_cases', 'postal_code'], axis=1).iloc[0].to_dict()
-        input_features = pd.DataFrame([features])
+    if address_postal_code_mapping_data.empty:
+        street_address = "Unknown"
+    else:
+        address_postal_code_mapping_data = address_postal_code_mapping_data.iloc[0]
+        street_address = address_postal_code_mapping_data.get('Street Address', '').title()
 
-        # Make prediction
-        try:
-            prediction = model.predict(input_features)[0]
-            risk_level = get_risk_level(prediction)
-        except Exception as e:
-            logger.error(f"Error making prediction: {str(e)}")
-            prediction = 0.0
-            risk_level = "Low"
-
-        # Create map
-        m = folium.Map(
-            location=[postal_info['postal_lat'], postal_info['postal_lon']], 
-            zoom_start=15
+    # Get the precomputed feature row for the landuse type
+    if landuse_type not in landuse_feature_rows:
+        raise HTTPException(
+        status_code=404,
+        detail=f"No matching data found for landuse type: {landuse_type}"
         )
+    row, features = landuse_feature_rows[landuse_type]
 
-        # Determine the color based on the risk level
-        risk_color = 'red' if risk_level == 'High' else 'orange' if risk_level == 'Medium' else 'green'
+    # Make prediction on a view of the feature matrix row
+    try:
+        prediction = model.predict(feature_matrix[row:row + 1])[0]
+        risk_level = get_risk_level(prediction)
+    except Exception as e:
+        logger.error(f"Error making prediction: {str(e)}")
+        prediction = 0.0
+        risk_level = "Low"
+
+    # Determine the color based on the risk level
+    risk_color = 'red' if risk_level == 'High' else 'orange' if risk_level == 'Medium' else 'green'
+
+    # Create a custom popup with adjustable width and colored risk level
+    popup_content = (
+        f"Postal Code: {postal_code}<br>"
+        + (f"Street Address: {street_address}<br>" if street_address != "Unknown" else "")
+        + f"Land Use Category: {postal_info['landuse_type'].title()}<br>"
+        f"Risk Level: <span style='color:{risk_color};'>{risk_level}</span>"
+    )
+
+    # Maps are stored under a hash of what they draw, so an unchanged map is
+    # served from the store instead of being rendered again
+    map_spec = {
+        "latitude": float(postal_info['postal_lat']),
+        "longitude": float(postal_info['postal_lon']),
+        "popup_content": popup_content,
+        "risk_color": risk_color,
+    }
+    map_file = map_store.ensure(map_spec, lambda: render_risk_map(**map_spec)).as_posix()
+
+    # Prepare response
+    location_info = {
+        "latitude": float(postal_info['postal_lat']),
+        "longitude": float(postal_info['postal_lon']),
+        "landuse_name": str(postal_info['landuse_name']),
+        "landuse_type": str(postal_info['landuse_type']),
+        "area_sqm": float(features.get('area_sqm', 0)),
+        "humidity_score": float(features.get('overall_humidity_score', 0)),
+        "rainfall_score": float(features.get('overall_rain_score', 0))
+    }
+
+    # Clusters and cases reported near the postal code
+    nearby = None
+    if cluster_proximity is not None:
+        nearby = proximity_for_postal_code(cluster_proximity, int(postal_code))
+    if nearby is not None:
+        location_info["nearby_clusters"] = nearby[
+            proximity_column("clusters", DEFAULT_RADIUS_M, DEFAULT_WINDOW_DAYS)
+        ]
+        location_info["total_cases"] = nearby[
+            proximity_column("cases", DEFAULT_RADIUS_M, DEFAULT_WINDOW_DAYS)
+        ]
+        location_info["cluster_proximity"] = nearby
+
+    # Built from trusted data in the shape of PredictionResponse, so it is
+    # encoded directly instead of being validated again
+    return dumps({
+        "status": "success",
+        "postal_code": int(postal_code),
+        "street_address": street_address,
+        "risk_level": risk_level,
+        "prediction_value": float(prediction),
+        "features": features,
+        "map_file": map_file,
+        "location_info": location_info
+    })
 
-        # Create a custom popup with adjustable width and colored risk level
-        popup_content = (
-            f"Postal Code: {postal_code}<br>"
-            + (f"Street Address: {street_address}<br>" if street_address != "Unknown" else "")
-            + f"Land Use Category: {postal_info['landuse_type'].title()}<br>"
-            f"Risk Level: <span style='color:{risk_color};'>{risk_level}</span>"
-        )
-        popup = folium.Popup(popup_content, max_width=300, show=True)  # Adjust max_width as needed
-
-        # Add marker with the custom popup
-        folium.Marker(
-            [postal_info['postal_lat'], postal_info['postal_lon']],
-            popup=popup,
-            icon=folium.Icon(
-                color=risk_color
+
+@app.post("/predict", response_model=PredictionResponse)
+async def predict_risk(request: PostalCodeRequest):
+    try:
+        postal_code = request.postal_code
+
+        # Reject unknown postal codes before touching any DataFrame
+        if int(postal_code) not in valid_postal_codes:
+            log_rejection_sampled(f"Rejected unknown postal code: {postal_code}")
+            raise HTTPException(
+                status_code=404,
+                detail=f"Postal code {postal_code} is not valid"
             )
-        ).add_to(m)
-
-        # Save map
-        map_file = f"static/risk_map_{postal_code}.html"
-        m.save(map_file)
-
-        # Prepare response
-        location_info = {
-            "latitude": float(postal_info['postal_lat']),
-            "longitude": float(postal_info['postal_lon']),
-            "landuse_name": str(postal_info['landuse_name']),
-            "landuse_type": str(postal_info['landuse_type']),
-            "area_sqm": float(features.get('area_sqm', 0)),
-            "humidity_score": float(features.get('overall_humidity_score', 0)),
-            "rainfall_score": float(features.get('overall_rain_score', 0))
-        }
 
-        return {
-            "status": "success",
-            "postal_code": int(postal_code),
-            "street_address": street_address,
-            "risk_level": risk_level,
-            "prediction_value": float(prediction),
-            "features": features,
-            "map_file": map_file,
-            "location_info": location_info
-        }
+        # Runs in the threadpool; callers asking for the same postal code while
+        # it runs wait for this result instead of predicting and drawing again
+        body = await single_flight.run("predict", postal_code, compute_prediction, postal_code)
+        return PreSerializedResponse(body)
 
     except HTTPException as he:
         raise he
@@ -239,36 +755,39 @@ async def predict_risk(request: PostalCodeRequest):
             detail=f"An unexpected error occurred: {str(e)}"
         )
 
-@app.get("/clusters/latest", response_model=Dict[str, Any])
-async def get_latest_clusters():
-    try:
-        # Extract the dengue cluster data and work on a copy
-        dengue_cluster_data = all_data["dengue_cluster"].copy()
-
-        # Ensure the 'Date' column is in datetime format
-        dengue_cluster_data["Date"] = pd.to_datetime(dengue_cluster_data["Date"])
-
-        # Group by 'Cluster Number' and get the latest record for each cluster
-        latest_clusters = (
-            dengue_cluster_data.sort_values("Date", ascending=False)
-            .groupby("Cluster Number")
-            .first()
-            .reset_index()
-        )
+def build_latest_clusters() -> Dict[str, Any]:
+    """Latest record of every cluster, largest clusters first"""
+    # Extract the dengue cluster data and work on a copy
+    dengue_cluster_data = all_data["dengue_cluster"].copy()
 
-        # Sort by 'Total Cases In Cluster' in descending order
-        latest_clusters = latest_clusters.sort_values(
-            "Total Cases In Cluster", ascending=False
-        )
+    # Ensure the 'Date' column is in datetime format
+    dengue_cluster_data["Date"] = pd.to_datetime(dengue_cluster_data["Date"])
+
+    # Group by 'Cluster Number' and get the latest record for each cluster
+    latest_clusters = (
+        dengue_cluster_data.sort_values("Date", ascending=False)
+        .groupby("Cluster Number")
+        .first()
+        .reset_index()
+    )
+
+    # Sort by 'Total Cases In Cluster' in descending order
+    latest_clusters = latest_clusters.sort_values(
+        "Total Cases In Cluster", ascending=False
+    )
 
-        # Convert 'Date' column to string to avoid serialization issues
-        if "Date" in latest_clusters.columns:
-            latest_clusters["Date"] = latest_clusters["Date"].astype(str)
+    # Convert 'Date' column to string to avoid serialization issues
+    if "Date" in latest_clusters.columns:
+        latest_clusters["Date"] = latest_clusters["Date"].astype(str)
 
-        # Convert the result to a list of dictionaries
-        latest_clusters_list = latest_clusters.to_dict(orient="records")
+    # Records are built column by column instead of with to_dict
+    return {"status": "success", "clusters": frame_records(latest_clusters)}
 
-        return {"status": "success", "clusters": latest_clusters_list}
+
+@app.get("/clusters/latest", response_model=Dict[str, Any])
+async def get_latest_clusters():
+    try:
+        return await cached_response("clusters_latest", build_latest_clusters)
 
     except Exception as e:
         logger.error(f"Error fetching latest clusters: {str(e)}")
@@ -278,94 +797,290 @@ async def get_latest_clusters():
             detail="An error occurred while fetching the latest cluster data.",
         )
 
-@app.get("/statistics/latest", response_model=Dict[str, Any])
-async def get_latest_statistics():
-    try:
-        # Extract the dengue cluster data
-        dengue_cluster_data = all_data["dengue_cluster"]
+# Number of rows serialized per chunk when streaming cluster history
+HISTORY_CHUNK_ROWS = int(os.environ.get("HISTORY_CHUNK_ROWS", "5000"))
 
-        # Ensure the 'Date' column is in datetime format
-        dengue_cluster_data["Date"] = pd.to_datetime(dengue_cluster_data["Date"])
 
-        # Get the latest date
-        latest_date = dengue_cluster_data["Date"].max()
+def iter_row_chunks(frame: pd.DataFrame, rows: slice, positions: Optional[np.ndarray],
+                    chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """Yield the selected rows in bounded chunks
 
-        # Filter data for the latest date
-        latest_data = dengue_cluster_data[dengue_cluster_data["Date"] == latest_date]
+    Without positions the rows are one contiguous range and every chunk is a
+    slice of it; positions (from a cluster filter) are gathered chunk by chunk.
+    """
+    if positions is None:
+        for start in range(rows.start, rows.stop, chunk_rows):
+            yield frame.iloc[start:min(start + chunk_rows, rows.stop)]
+    else:
+        for start in range(0, len(positions), chunk_rows):
+            yield frame.iloc[positions[start:start + chunk_rows]]
 
-        # Calculate total cases
-        total_cases = int(latest_data["Number Of Cases"].sum())
 
-        # Calculate average incidence rate (cases per 1000 population)
-        total_population = 5_700_000  # Assuming total population is 5.7 million
-        incidence_rate = round((total_cases / total_population) * 1000, 2)
+def iter_ndjson_chunks(chunks: Iterator[pd.DataFrame]) -> Iterator[str]:
+    """Yield the chunks as newline-delimited JSON"""
+    for chunk in chunks:
+        yield chunk.to_json(orient="records", lines=True, date_format="iso")
 
-        # Calculate active clusters (clusters with recent cases > 0)
-        active_clusters = int(latest_data[latest_data["Recent Cases In Cluster"] > 0]["Cluster Number"].nunique())
 
-        # Find the cluster with the highest number of cases
-        highest_case_cluster = latest_data.loc[latest_data["Number Of Cases"].idxmax()]
-        highest_case_cluster_info = {
-            "number_of_cases": int(highest_case_cluster["Number Of Cases"]),
-            "street_address": highest_case_cluster["Street Address"].title(),
-        }
+def arrow_schema(frame: pd.DataFrame):
+    """Arrow schema of frame with explicit types, text columns typed as strings
 
-        # Prepare the response
-        response = {
-            "status": "success",
-            "total_cases": total_cases,
-            "average_incidence_rate": incidence_rate,  # Already rounded to 2 decimal places
-            "active_clusters": active_clusters,
-            "highest_case_cluster": highest_case_cluster_info,
-        }
+    Object columns would otherwise be typed from their values, which gives
+    null for an empty sample and fails on the first batch with any text in it.
+    Other columns take their type from the dtype alone.
+    """
+    import pyarrow as pa
+
+    fields = []
+    for column, dtype in frame.dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype) or pd.api.types.is_string_dtype(dtype):
+            fields.append(pa.field(column, pa.string()))
+        else:
+            fields.append(pa.field(column, pa.array(frame[column].iloc[:0]).type))
+    return pa.schema(fields)
+
+
+def arrow_batch(chunk: pd.DataFrame, schema):
+    """One record batch of chunk, with categorical columns decoded to strings"""
+    import pyarrow as pa
+
+    categorical = [column for column, dtype in chunk.dtypes.items() if isinstance(dtype, pd.CategoricalDtype)]
+    if categorical:
+        chunk = chunk.astype({column: object for column in categorical})
+    return pa.RecordBatch.from_pandas(chunk, schema=schema, preserve_index=False)
+
+
+def iter_arrow_chunks(chunks: Iterator[pd.DataFrame], schema) -> Iterator[bytes]:
+    """Yield the chunks as an Arrow IPC stream, one record batch per chunk"""
+    import pyarrow as pa
+
+    sink = io.BytesIO()
+    writer = pa.ipc.new_stream(sink, schema)
+    for chunk in chunks:
+        writer.write_batch(arrow_batch(chunk, schema))
+        yield sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+    writer.close()
+    yield sink.getvalue()
+
+
+@app.get("/clusters/history")
+async def get_cluster_history(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    cluster: Optional[str] = None,
+    format: str = Query("ndjson", pattern="^(ndjson|arrow)$"),
+):
+    if start_date and end_date and start_date > end_date:
+        raise HTTPException(
+            status_code=400,
+            detail="start_date must not be later than end_date",
+        )
+
+    if format == "arrow":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HTTPException(
+                status_code=501,
+                detail="Arrow export requires pyarrow to be installed on the server.",
+            )
+
+    try:
+        dengue_cluster_data = all_data["dengue_cluster"]
 
-        return response
+        # Narrow to the date range by binary search, then apply the cluster
+        # filter inside it; rows themselves are only materialized chunk by
+        # chunk while the response is streamed
+        rows = cluster_date_range(start_date, end_date)
+        # Row positions are only needed when a cluster filter leaves gaps
+        positions = None
+        if cluster:
+            in_range = dengue_cluster_data["Cluster Number"].iloc[rows]
+            positions = rows.start + np.flatnonzero((in_range.astype(str) == cluster).to_numpy())
+
+        # Typed and checked against the first chunk before the response
+        # starts, so a conversion error is a 500 and not a truncated stream
+        if format == "arrow":
+            schema = arrow_schema(dengue_cluster_data)
+            first_chunk = next(iter_row_chunks(dengue_cluster_data, rows, positions, HISTORY_CHUNK_ROWS), None)
+            if first_chunk is not None:
+                arrow_batch(first_chunk, schema)
 
     except Exception as e:
-        logger.error(f"Error fetching latest statistics: {str(e)}")
+        logger.error(f"Error preparing cluster history: {str(e)}")
         logger.error(traceback.format_exc())
         raise HTTPException(
             status_code=500,
-            detail="An error occurred while fetching the latest statistics.",
+            detail="An error occurred while preparing the cluster history.",
         )
 
-@app.get("/statistics/incidence-rate", response_model=Dict[str, Any])
-async def get_monthly_incidence_rate():
+    if format == "arrow":
+        return StreamingResponse(
+            iter_arrow_chunks(
+                iter_row_chunks(dengue_cluster_data, rows, positions, HISTORY_CHUNK_ROWS), schema
+            ),
+            media_type="application/vnd.apache.arrow.stream",
+        )
+    return StreamingResponse(
+        iter_ndjson_chunks(iter_row_chunks(dengue_cluster_data, rows, positions, HISTORY_CHUNK_ROWS)),
+        media_type="application/x-ndjson",
+    )
+
+@app.get("/risk-grid", response_model=Dict[str, Any])
+async def get_risk_grid():
+    # The whole layer is scored, tiled and encoded ahead of time
+    return await cached_response("risk_grid", lambda: loaded(risk_grid_layer, "risk grid"))
+
+@app.get("/tiles/{z}/{x}/{y}")
+async def get_tile(z: int, x: int, y: int):
+    if not (TILE_MIN_ZOOM <= z <= TILE_MAX_ZOOM) or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise HTTPException(status_code=404, detail=f"Tile {z}/{x}/{y} does not exist")
+
+    layers = loaded(tile_layers, "map tile layers")
+    headers = {"Cache-Control": f"public, max-age={TILE_CACHE_MAX_AGE}"}
     try:
-        # Extract the dengue cluster data and work on a copy
-        dengue_cluster_data = all_data["dengue_cluster"].copy()
+        # Tiles are cut once and served from the disk cache afterwards;
+        # concurrent requests for an uncached tile share one build
+        path = await single_flight.run("tile", (z, x, y), ensure_tile, layers, z, x, y)
+    except Exception as e:
+        logger.error(f"Error building tile {z}/{x}/{y}: {str(e)}")
+        logger.error(traceback.format_exc())
+        raise HTTPException(
+            status_code=500,
+            detail="An error occurred while building the map tile.",
+        )
 
-        # Ensure the 'Date' column is in datetime format
-        dengue_cluster_data["Date"] = pd.to_datetime(dengue_cluster_data["Date"])
+    if path is None:
+        # Outside the data extent: nothing to draw and nothing worth caching
+        return JSONResponse(
+            {"type": "FeatureCollection", "features": []},
+            media_type="application/geo+json",
+            headers=headers,
+        )
+    return FileResponse(path, media_type="application/geo+json", headers=headers)
 
-        # Add a 'Month' column for grouping
-        dengue_cluster_data["Month"] = dengue_cluster_data["Date"].dt.to_period("M")
+@app.get("/forecast", response_model=Dict[str, Any])
+async def get_forecast(region: Optional[str] = None):
+    try:
+        # Reloaded in the background, so requests never stat or unpickle the file
+        forecasts = loaded(forecast_state["forecasts"], "forecasts")
+        regions = forecasts["regions"]
+
+        if region is not None:
+            if region not in regions:
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"No forecast available for region {region}",
+                )
+            selected = [regions.index(region)]
+        else:
+            selected = range(len(regions))
+
+        # Forecasts are computed for every region in one batch ahead of time;
+        # this only slices out the requested rows
+        region_forecasts = [
+            {
+                "region": regions[i],
+                "last_observed_cases": float(forecasts["last_observed_cases"][i]),
+                "predicted_cases": forecasts["predicted_cases"][i].tolist(),
+            }
+            for i in selected
+        ]
 
-        # Group by 'Month' and calculate total cases for each month
-        monthly_cases = (
-            dengue_cluster_data.groupby("Month")["Number Of Cases"].sum().reset_index()
+        return PreSerializedResponse({
+            "status": "success",
+            "generated_at": forecasts["generated_at"],
+            "method": forecasts["method"],
+            "last_observed_week": forecasts["last_observed_week"],
+            "forecast_weeks": forecasts["forecast_weeks"],
+            "forecasts": region_forecasts,
+        })
+
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Error fetching forecasts: {str(e)}")
+        logger.error(traceback.format_exc())
+        raise HTTPException(
+            status_code=500,
+            detail="An error occurred while fetching the forecasts.",
         )
 
-        # Convert 'Month' column to string format
-        monthly_cases["Month"] = monthly_cases["Month"].astype(str)
+def build_latest_statistics() -> Dict[str, Any]:
+    """Case, incidence and cluster statistics for the latest reported date"""
+    # Extract the dengue cluster data
+    dengue_cluster_data = all_data["dengue_cluster"]
+
+    # Rows for the latest date sit at the end of the date-sorted history
+    latest_data = dengue_cluster_data.iloc[latest_cluster_date_range()]
+
+    # Calculate total cases
+    total_cases = int(latest_data["Number Of Cases"].sum())
+
+    # Calculate average incidence rate (cases per 1000 population)
+    total_population = 5_700_000  # Assuming total population is 5.7 million
+    incidence_rate = round((total_cases / total_population) * 1000, 2)
+
+    # Calculate active clusters (clusters with recent cases > 0)
+    active_clusters = int(latest_data[latest_data["Recent Cases In Cluster"] > 0]["Cluster Number"].nunique())
+
+    # Find the cluster with the highest number of cases
+    highest_case_cluster = latest_data.loc[latest_data["Number Of Cases"].idxmax()]
+    highest_case_cluster_info = {
+        "number_of_cases": int(highest_case_cluster["Number Of Cases"]),
+        "street_address": highest_case_cluster["Street Address"].title(),
+    }
+
+    # Prepare the response
+    return {
+        "status": "success",
+        "total_cases": total_cases,
+        "average_incidence_rate": incidence_rate,  # Already rounded to 2 decimal places
+        "active_clusters": active_clusters,
+        "highest_case_cluster": highest_case_cluster_info,
+    }
 
-        # Calculate incidence rate for each month
-        total_population = 5_700_000  # Assuming total population is 5.7 million
-        monthly_cases["Incidence Rate"] = monthly_cases["Number Of Cases"].apply(
-            lambda total_cases: round((total_cases / total_population) * 1000, 2)
+
+@app.get("/statistics/latest", response_model=Dict[str, Any])
+async def get_latest_statistics():
+    try:
+        return await cached_response("statistics_latest", build_latest_statistics)
+
+    except Exception as e:
+        logger.error(f"Error fetching latest statistics: {str(e)}")
+        logger.error(traceback.format_exc())
+        raise HTTPException(
+            status_code=500,
+            detail="An error occurred while fetching the latest statistics.",
         )
 
-        # Convert the result to a list of dictionaries
-        monthly_incidence_rate = monthly_cases.to_dict(orient="records")
+def build_monthly_incidence_rate() -> Dict[str, Any]:
+    """Cases and incidence rate per month"""
+    # Monthly totals are aggregated once at startup rather than per request
+    incidence = loaded(monthly_cases, "monthly aggregates").copy()
 
-        # Prepare the response
-        response = {
-            "status": "success",
-            "monthly_incidence_rate": monthly_incidence_rate,
-        }
+    # Calculate incidence rate for each month
+    total_population = 5_700_000  # Assuming total population is 5.7 million
+    incidence["Incidence Rate"] = incidence["Number Of Cases"].apply(
+        lambda total_cases: round((total_cases / total_population) * 1000, 2)
+    )
+
+    # Prepare the response
+    return {
+        "status": "success",
+        "monthly_incidence_rate": frame_records(incidence),
+    }
 
-        return response
 
+@app.get("/statistics/incidence-rate", response_model=Dict[str, Any])
+async def get_monthly_incidence_rate():
+    try:
+        return await cached_response("statistics_incidence_rate", build_monthly_incidence_rate)
+
+    except HTTPException as he:
+        raise he
     except Exception as e:
         logger.error(f"Error calculating monthly incidence rates: {str(e)}")
         logger.error(traceback.format_exc())
@@ -373,7 +1088,15 @@ async def get_monthly_incidence_rate():
             status_code=500,
             detail="An error occurred while calculating the monthly incidence rates.",
         )
-    
+
+# Responses encoded once at startup (or on first request if that fails)
+RESPONSE_BUILDERS = {
+    "clusters_latest": build_latest_clusters,
+    "statistics_latest": build_latest_statistics,
+    "statistics_incidence_rate": build_monthly_incidence_rate,
+    "risk_grid": lambda: loaded(risk_grid_layer, "risk grid"),
+}
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -0,0 +1,162 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger("map_store")
+
+# Store location, inside the mounted static directory so maps are served as before
+MAP_STORE_DIR = os.environ.get("MAP_STORE_DIR", "static/maps")
+# Eviction policy: maps older than the max age go first, then the least
+# recently used ones until the store fits in the size budget
+MAP_STORE_MAX_BYTES = int(os.environ.get("MAP_STORE_MAX_MB", "512")) * 1024 ** 2
+MAP_STORE_MAX_AGE_SECONDS = int(os.environ.get("MAP_STORE_MAX_AGE_HOURS", "24")) * 3600
+MAP_STORE_GC_INTERVAL_SECONDS = int(os.environ.get("MAP_STORE_GC_INTERVAL_SECONDS", "300"))
+# Per-postal-code maps written before the store existed; removed by age only
+LEGACY_MAP_PATTERN = "risk_map_*.html"
+# Temp files this old were left by a crashed writer
+STALE_TMP_SECONDS = 600
+
+
+def map_key(spec: dict) -> str:
+    """Content address of a map: a hash of everything it draws"""
+    canonical = json.dumps(spec, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()[:32]
+
+
+class MapStore:
+    """Disk-bounded store of rendered map HTML files
+
+    Files are named by map_key and fanned out over 256 subdirectories so no
+    directory grows large. Writes go to a temp file that is renamed into
+    place, so readers never see a partial map. collect_garbage() enforces the
+    age and size limits and is run periodically by the API.
+    """
+
+    def __init__(self, directory: str = MAP_STORE_DIR, max_bytes: int = MAP_STORE_MAX_BYTES,
+                 max_age_seconds: int = MAP_STORE_MAX_AGE_SECONDS):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+        self._files = 0
+        self._bytes = 0
+        self._writes = 0
+        self._reuses = 0
+        self._last_gc = None
+
+    def path_for(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.html"
+
+    def ensure(self, spec: dict, render) -> Path:
+        """Path of the map described by spec, calling render() for its HTML only if it is not stored"""
+        path = self.path_for(map_key(spec))
+        if path.exists():
+            try:
+                # Refresh the age so maps in use are evicted last
+                os.utime(path)
+                with self._lock:
+                    self._reuses += 1
+                return path
+            except FileNotFoundError:
+                # Evicted between the check and the touch: render it again
+                pass
+
+        html = render().encode()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(html)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._files += 1
+            self._bytes += len(html)
+            self._writes += 1
+        return path
+
+    def _scan(self):
+        """(mtime, size, path) of every stored map, removing stale temp files on the way"""
+        entries = []
+        now = time.time()
+        if not self.directory.exists():
+            return entries
+        for subdirectory in os.scandir(self.directory):
+            if not subdirectory.is_dir():
+                continue
+            for entry in os.scandir(subdirectory.path):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                if entry.name.endswith(".tmp"):
+                    if now - stat.st_mtime > STALE_TMP_SECONDS:
+                        Path(entry.path).unlink(missing_ok=True)
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _remove_legacy_maps(self, cutoff: float) -> int:
+        removed = 0
+        for path in self.directory.parent.glob(LEGACY_MAP_PATTERN):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    removed += 1
+            except FileNotFoundError:
+                continue
+        return removed
+
+    def collect_garbage(self) -> dict:
+        """Evict maps past the max age, then the oldest until under the size budget"""
+        start = time.perf_counter()
+        cutoff = time.time() - self.max_age_seconds
+        entries = sorted(self._scan())
+
+        removed_files = removed_bytes = 0
+        total_bytes = sum(size for _, size, _ in entries)
+        for mtime, size, path in entries:
+            if mtime >= cutoff and total_bytes <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            removed_files += 1
+            removed_bytes += size
+            total_bytes -= size
+        legacy_removed = self._remove_legacy_maps(cutoff)
+
+        result = {
+            "finished_at": time.time(),
+            "seconds": round(time.perf_counter() - start, 3),
+            "removed_files": removed_files,
+            "removed_bytes": removed_bytes,
+            "legacy_removed_files": legacy_removed,
+        }
+        with self._lock:
+            self._files = len(entries) - removed_files
+            self._bytes = total_bytes
+            self._last_gc = result
+        if removed_files or legacy_removed:
+            logger.info(
+                f"Map store GC removed {removed_files} maps ({removed_bytes / 1024 ** 2:.1f} MB) and "
+                f"{legacy_removed} legacy maps in {result['seconds']:.2f}s; "
+                f"{self._files} maps ({self._bytes / 1024 ** 2:.1f} MB) remain"
+            )
+        return result
+
+    def stats(self) -> dict:
+        """Store size and activity since startup; size is exact as of the last GC"""
+        with self._lock:
+            return {
+                "files": self._files,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "max_age_seconds": self.max_age_seconds,
+                "writes": self._writes,
+                "reuses": self._reuses,
+                "last_gc": self._last_gc,
+            }
@@ -0,0 +1,292 @@
+import pandas as pd
+import numpy as np
+import pickle
+import json
+import shutil
+import logging
+import math
+import os
+import threading
+import time
+import shapely
+from shapely.geometry import Polygon, MultiPolygon, box, mapping
+from pathlib import Path
+
+from model_training import (
+    MODEL_PATH, PROCESSED_DATA_PATH, build_feature_matrix, file_sha256, load_manifest, model_feature_order
+)
+from risk_grid import RISK_LEVELS, classify_risk, score_landuse_types, score_postal_codes
+
+logger = logging.getLogger("map_tiles")
+
+# Zoom levels served as tiles; Singapore fits in a handful of tiles at z10
+TILE_MIN_ZOOM = 10
+TILE_MAX_ZOOM = 15
+# Individual postal code risk points are only included from this zoom on
+POSTAL_MIN_ZOOM = 14
+# Tiles are simplified to roughly one pixel of a 256px tile
+TILE_PIXELS = 256
+
+TILE_CACHE_DIR = os.environ.get("TILE_CACHE_DIR", "tile_cache")
+LAND_USE_DATA_PATH = os.environ.get("LAND_USE_DATA_PATH", "land_use_data.pkl")
+
+
+def tile_bounds(z: int, x: int, y: int):
+    """Return (lon_min, lat_min, lon_max, lat_max) of a Web Mercator tile"""
+    n = 2 ** z
+    lon_min = x / n * 360.0 - 180.0
+    lon_max = (x + 1) / n * 360.0 - 180.0
+    lat_max = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    lat_min = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return lon_min, lat_min, lon_max, lat_max
+
+
+def lonlat_to_tile(lon: float, lat: float, z: int):
+    """Return the (x, y) Web Mercator tile containing a point"""
+    n = 2 ** z
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+    return x, y
+
+
+def landuse_geometry(coordinates):
+    """Build a Polygon or MultiPolygon, holes included, from GeoJSON-style coordinates"""
+    def ring_2d(ring):
+        return [(coord[0], coord[1]) for coord in ring]
+
+    def polygon(rings):
+        return Polygon(ring_2d(rings[0]), [ring_2d(ring) for ring in rings[1:]])
+
+    # MultiPolygon coordinates nest one level deeper than Polygon coordinates
+    if isinstance(coordinates[0][0][0], (list, tuple)):
+        return MultiPolygon([polygon(rings) for rings in coordinates])
+    return polygon(coordinates)
+
+
+def load_landuse(path: str = LAND_USE_DATA_PATH) -> pd.DataFrame:
+    """Load land-use polygons, or an empty frame if they are not deployed with the API"""
+    if not os.path.exists(path):
+        logger.warning(f"{path} not found, tiles will not include land-use polygons")
+        return pd.DataFrame(columns=["name", "lu_desc", "coordinates"])
+    return pd.read_pickle(path)
+
+
+def prepare_layers(all_data: dict, data: pd.DataFrame, feature_matrix: np.ndarray, model,
+                   model_sha256: str, land_use_df: pd.DataFrame) -> dict:
+    """Build the in-memory geometry, cluster and risk layers tiles are cut from"""
+    start_time = time.time()
+
+    # Land-use polygons with the model's risk level for their landuse type
+    geometries = []
+    keep = []
+    for i, coordinates in enumerate(land_use_df["coordinates"]):
+        try:
+            geometries.append(landuse_geometry(coordinates))
+            keep.append(i)
+        except Exception as e:
+            logger.warning(f"Skipping land-use polygon {i}: {str(e)}")
+    landuse = land_use_df.iloc[keep][["name", "lu_desc"]].reset_index(drop=True)
+    geometries = np.array(geometries, dtype=object)
+
+    type_predictions = score_landuse_types(data, feature_matrix, model, landuse["lu_desc"].unique())
+    landuse_predictions = landuse["lu_desc"].map(type_predictions).to_numpy(dtype=np.float64)
+    landuse["risk_level"] = np.where(
+        np.isnan(landuse_predictions), None, RISK_LEVELS[classify_risk(landuse_predictions)]
+    )
+
+    # Latest record for every cluster
+    dengue_cluster = all_data["dengue_cluster"]
+    clusters = (
+        dengue_cluster.sort_values("Date", kind="stable")
+        .groupby("Cluster Number", sort=False)
+        .tail(1)
+    )
+    clusters = pd.DataFrame({
+        "lon": clusters["Longitude"].to_numpy(dtype=np.float64),
+        "lat": clusters["Latitude"].to_numpy(dtype=np.float64),
+        "cluster_number": clusters["Cluster Number"].astype(str).to_numpy(),
+        "street_address": clusters["Street Address"].astype(str).str.title().to_numpy(),
+        "number_of_cases": clusters["Number Of Cases"].to_numpy(dtype=np.int64),
+        "total_cases_in_cluster": clusters["Total Cases In Cluster"].to_numpy(dtype=np.int64),
+        "date": clusters["Date"].dt.strftime("%Y-%m-%d").to_numpy(),
+    })
+
+    # Risk for every postal code
+    scored = score_postal_codes(all_data["postal_landuse_mapping"], data, feature_matrix, model)
+    postal = pd.DataFrame({
+        "lon": scored["lon"].to_numpy(dtype=np.float64),
+        "lat": scored["lat"].to_numpy(dtype=np.float64),
+        "postal_code": scored["postal_code"].to_numpy(),
+        "risk_level": RISK_LEVELS[scored["risk_code"].to_numpy()],
+        "prediction": np.round(scored["prediction"].to_numpy(dtype=np.float64), 3),
+    })
+
+    # Overall extent, used to decide which tiles are worth caching
+    extents = [postal[["lon", "lat"]].to_numpy(), clusters[["lon", "lat"]].to_numpy()]
+    if len(geometries):
+        landuse_bounds = shapely.bounds(geometries)
+        extents += [landuse_bounds[:, :2], landuse_bounds[:, 2:]]
+    points = np.concatenate(extents) if sum(len(e) for e in extents) else np.zeros((1, 2))
+    bounds = (*points.min(axis=0), *points.max(axis=0))
+
+    # Data and model version keys the tile cache so new data or a new model
+    # never serves stale tiles
+    latest_date = dengue_cluster["Date"].max() if len(dengue_cluster) else None
+    version = f"{pd.Timestamp(latest_date):%Y%m%d}" if latest_date is not None else "empty"
+    version += f"-{len(landuse)}-{len(clusters)}-{len(postal)}-{model_sha256[:12]}"
+
+    logger.info(
+        f"Prepared tile layers ({len(landuse)} polygons, {len(clusters)} clusters, "
+        f"{len(postal)} postal codes) in {time.time() - start_time:.2f} seconds"
+    )
+    return {
+        "version": version,
+        "bounds": bounds,
+        "landuse": landuse,
+        "landuse_geometries": geometries,
+        "landuse_tree": shapely.STRtree(geometries),
+        "clusters": clusters,
+        "postal": postal,
+    }
+
+
+def point_features(frame: pd.DataFrame, bounds, layer: str):
+    """GeoJSON point features for the rows of frame inside bounds"""
+    lon_min, lat_min, lon_max, lat_max = bounds
+    inside = (
+        (frame["lon"] >= lon_min) & (frame["lon"] < lon_max)
+        & (frame["lat"] >= lat_min) & (frame["lat"] < lat_max)
+    )
+    features = []
+    for record in frame[inside].to_dict(orient="records"):
+        lon = record.pop("lon")
+        lat = record.pop("lat")
+        record["layer"] = layer
+        features.append({
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [round(lon, 6), round(lat, 6)]},
+            "properties": record,
+        })
+    return features
+
+
+def build_tile(layers: dict, z: int, x: int, y: int) -> dict:
+    """Cut one tile from the prepared layers as a GeoJSON FeatureCollection"""
+    bounds = tile_bounds(z, x, y)
+    tolerance = (bounds[2] - bounds[0]) / TILE_PIXELS
+
+    features = []
+
+    # Land-use polygons, simplified to about a pixel and clipped to the tile;
+    # polygons smaller than a pixel are dropped at this zoom
+    candidates = layers["landuse_tree"].query(box(*bounds))
+    if len(candidates):
+        geometries = layers["landuse_geometries"][candidates]
+        extent = shapely.bounds(geometries)
+        visible = np.maximum(extent[:, 2] - extent[:, 0], extent[:, 3] - extent[:, 1]) >= tolerance
+        candidates = candidates[visible]
+        simplified = shapely.simplify(geometries[visible], tolerance, preserve_topology=True)
+        clipped = shapely.clip_by_rect(simplified, *bounds)
+        landuse = layers["landuse"]
+        for idx, geometry in zip(candidates, clipped):
+            if geometry.is_empty:
+                continue
+            features.append({
+                "type": "Feature",
+                "geometry": mapping(geometry),
+                "properties": {
+                    "layer": "landuse",
+                    "name": landuse.at[idx, "name"],
+                    "landuse_type": landuse.at[idx, "lu_desc"],
+                    "risk_level": landuse.at[idx, "risk_level"],
+                },
+            })
+
+    features += point_features(layers["clusters"], bounds, "cluster")
+    if z >= POSTAL_MIN_ZOOM:
+        features += point_features(layers["postal"], bounds, "postal")
+
+    return {"type": "FeatureCollection", "features": features}
+
+
+def tile_path(layers: dict, z: int, x: int, y: int) -> Path:
+    """Cache location of a tile for the current data version"""
+    return Path(TILE_CACHE_DIR) / layers["version"] / str(z) / str(x) / f"{y}.geojson"
+
+
+def remove_stale_tile_versions(version: str) -> None:
+    """Delete cached tiles of every version other than the current one"""
+    cache_dir = Path(TILE_CACHE_DIR)
+    if not cache_dir.is_dir():
+        return
+    for path in cache_dir.iterdir():
+        if path.is_dir() and path.name != version:
+            shutil.rmtree(path, ignore_errors=True)
+            logger.info(f"Removed stale tile cache {path}")
+
+
+def tile_in_bounds(layers: dict, z: int, x: int, y: int) -> bool:
+    """Whether a tile overlaps the data extent (only those are cached on disk)"""
+    lon_min, lat_min, lon_max, lat_max = tile_bounds(z, x, y)
+    data_lon_min, data_lat_min, data_lon_max, data_lat_max = layers["bounds"]
+    return not (
+        lon_max < data_lon_min or lon_min > data_lon_max
+        or lat_max < data_lat_min or lat_min > data_lat_max
+    )
+
+
+def write_tile(path: Path, tile: dict) -> None:
+    """Write a tile atomically so readers never see a partial file"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Unique per writer thread, so concurrent writers never share a temp file
+    tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(tile, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def ensure_tile(layers: dict, z: int, x: int, y: int):
+    """Return the cached tile path, building it first if needed; None for empty tiles"""
+    if not tile_in_bounds(layers, z, x, y):
+        return None
+    path = tile_path(layers, z, x, y)
+    if not path.exists():
+        write_tile(path, build_tile(layers, z, x, y))
+    return path
+
+
+def precompute_tiles(layers: dict, min_zoom: int = TILE_MIN_ZOOM, max_zoom: int = TILE_MAX_ZOOM) -> int:
+    """Build and cache every tile overlapping the data extent"""
+    lon_min, lat_min, lon_max, lat_max = layers["bounds"]
+    count = 0
+    for z in range(min_zoom, max_zoom + 1):
+        start_time = time.time()
+        x_min, y_min = lonlat_to_tile(lon_min, lat_max, z)
+        x_max, y_max = lonlat_to_tile(lon_max, lat_min, z)
+        for x in range(x_min, x_max + 1):
+            for y in range(y_min, y_max + 1):
+                ensure_tile(layers, z, x, y)
+                count += 1
+        logger.info(f"Cached zoom {z} tiles in {time.time() - start_time:.2f} seconds")
+    return count
+
+
+def main():
+    with open("combined_data.pkl", "rb") as f:
+        all_data = pickle.load(f)
+    with open(PROCESSED_DATA_PATH, "rb") as f:
+        data = pickle.load(f)
+    with open(MODEL_PATH, "rb") as f:
+        model = pickle.load(f)
+    all_data["dengue_cluster"]["Date"] = pd.to_datetime(all_data["dengue_cluster"]["Date"])
+
+    feature_matrix = build_feature_matrix(data, model_feature_order(model, data, load_manifest()), model)
+    layers = prepare_layers(all_data, data, feature_matrix, model, file_sha256(MODEL_PATH), load_landuse())
+    remove_stale_tile_versions(layers["version"])
+    count = precompute_tiles(layers)
+    logger.info(f"Cached {count} tiles under {Path(TILE_CACHE_DIR) / layers['version']}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
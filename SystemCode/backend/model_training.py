@@ -0,0 +1,278 @@
+import pandas as pd
+import numpy as np
+import pickle
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+import warnings
+from pathlib import Path
+
+from forecasting import postal_sector
+from risk_grid import LOW_RISK_THRESHOLD, HIGH_RISK_THRESHOLD
+
+logger = logging.getLogger("model_training")
+
+PROCESSED_DATA_PATH = "processed_dengue_data_combined_all.pkl"
+# The published artifact the API loads, and the manifest describing it
+MODEL_PATH = "dengue_RFR_model.pkl"
+MODEL_MANIFEST_PATH = os.environ.get("MODEL_MANIFEST_PATH", "dengue_RFR_model.manifest.json")
+# Every trained version is kept here as <version>/model.pkl + manifest.json
+MODEL_DIR = os.environ.get("MODEL_DIR", "models")
+
+TARGET_COLUMN = "total_cases"
+NON_FEATURE_COLUMNS = [TARGET_COLUMN, "postal_code"]
+
+# RandomForest hyperparameter grid searched with grouped cross-validation
+PARAM_GRID = {
+    "n_estimators": [100, 300],
+    "max_depth": [None, 8, 16],
+    "min_samples_leaf": [1, 3, 5],
+    "max_features": [1.0, "sqrt"],
+}
+CV_FOLDS = 5
+RANDOM_STATE = 42
+
+
+def file_sha256(path: str) -> str:
+    """SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def feature_columns(data: pd.DataFrame) -> list:
+    """Model input columns of the processed data, in the order the model sees them"""
+    return [column for column in data.columns if column not in NON_FEATURE_COLUMNS]
+
+
+def model_feature_order(model, data: pd.DataFrame, manifest=None) -> list:
+    """Feature order the model was trained with: manifest, then fitted model, then data columns"""
+    if manifest is not None:
+        return list(manifest["features"])
+    model_features = getattr(model, "feature_names_in_", None)
+    if model_features is not None:
+        return list(model_features)
+    logger.warning("Model records no feature names, assuming the processed data column order")
+    return feature_columns(data)
+
+
+def build_feature_matrix(data: pd.DataFrame, features: list, model) -> np.ndarray:
+    """Convert data to one C-contiguous float32 matrix with columns in model order
+
+    Trees compare in float32, so rows sliced from this matrix reach the model
+    without a copy. Raises ValueError if data or model do not fit the schema;
+    non-finite values are only logged, since most rows are never predicted
+    on and the forest predicts through NaN as a missing value.
+    """
+    missing = [feature for feature in features if feature not in data.columns]
+    if missing:
+        raise ValueError(f"Processed data is missing model features: {missing}")
+    n_model_features = getattr(model, "n_features_in_", len(features))
+    if n_model_features != len(features):
+        raise ValueError(f"Model expects {n_model_features} features, schema lists {len(features)}")
+    matrix = np.ascontiguousarray(data[features].to_numpy(dtype=np.float32))
+    non_finite_rows = int((~np.isfinite(matrix)).any(axis=1).sum())
+    if non_finite_rows:
+        logger.warning(f"{non_finite_rows} of {len(matrix)} feature rows have non-finite values")
+    return matrix
+
+
+def build_training_set(data: pd.DataFrame):
+    """Feature matrix, target and spatial group (postal sector) of every row"""
+    X = data[feature_columns(data)].astype(np.float64)
+    y = data[TARGET_COLUMN].to_numpy(dtype=np.float64)
+    # Nearby postal codes share features and case counts, so folds are split
+    # by postal sector to keep neighbours out of each other's validation fold
+    groups = postal_sector(data["postal_code"]).fillna("unknown").to_numpy()
+    return X, y, groups
+
+
+def search_hyperparameters(X: pd.DataFrame, y: np.ndarray, groups: np.ndarray,
+                           n_splits: int = CV_FOLDS, n_jobs: int = -1, param_grid: dict = PARAM_GRID):
+    """Grid-search RandomForest settings with spatially grouped CV, folds run in parallel"""
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.model_selection import GridSearchCV, GroupKFold
+
+    n_groups = len(np.unique(groups))
+    if n_groups < 2:
+        raise ValueError(f"Need at least 2 postal sectors for grouped CV, found {n_groups}")
+    n_splits = min(n_splits, n_groups)
+
+    # Parallelise across folds and candidates; each forest stays single-threaded
+    # so the two levels do not oversubscribe the CPUs
+    search = GridSearchCV(
+        RandomForestRegressor(random_state=RANDOM_STATE, n_jobs=1),
+        param_grid,
+        cv=GroupKFold(n_splits=n_splits),
+        scoring={"rmse": "neg_root_mean_squared_error", "mae": "neg_mean_absolute_error", "r2": "r2"},
+        refit="rmse",
+        n_jobs=n_jobs,
+    )
+    start_time = time.time()
+    search.fit(X, y, groups=groups)
+    logger.info(
+        f"Searched {len(search.cv_results_['params'])} candidates x {n_splits} folds "
+        f"in {time.time() - start_time:.2f} seconds"
+    )
+    return search
+
+
+def cv_metrics(search) -> dict:
+    """Cross-validated accuracy of the best candidate"""
+    results = search.cv_results_
+    best = search.best_index_
+    return {
+        "rmse": round(float(-results["mean_test_rmse"][best]), 4),
+        "rmse_std": round(float(results["std_test_rmse"][best]), 4),
+        "mae": round(float(-results["mean_test_mae"][best]), 4),
+        "r2": round(float(results["mean_test_r2"][best]), 4),
+        "mean_fit_seconds": round(float(results["mean_fit_time"][best]), 4),
+    }
+
+
+def measure_inference_latency(model, X: pd.DataFrame, repeats: int = 200) -> dict:
+    """Single-row latency as the API calls the model, plus batched per-row cost"""
+    # The API predicts on one-row slices of a float32 matrix in model order
+    matrix = build_feature_matrix(X, list(X.columns), model)
+    rng = np.random.default_rng(RANDOM_STATE)
+    rows = rng.integers(0, len(X), size=repeats)
+    timings = []
+    with warnings.catch_warnings():
+        # Fitted on a DataFrame; the column order is the one it was fitted with
+        warnings.filterwarnings("ignore", message="X does not have valid feature names")
+        for row in rows:
+            start = time.perf_counter()
+            model.predict(matrix[row:row + 1])
+            timings.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        model.predict(matrix)
+        batch_seconds = time.perf_counter() - start
+    timings_ms = np.array(timings) * 1000
+    return {
+        "single_row_ms_p50": round(float(np.percentile(timings_ms, 50)), 3),
+        "single_row_ms_p95": round(float(np.percentile(timings_ms, 95)), 3),
+        "batch_rows": len(X),
+        "batch_us_per_row": round(batch_seconds / len(X) * 1e6, 3),
+    }
+
+
+def build_manifest(version: str, model, features: list, data_hash: str, search,
+                   training_seconds: float, latency: dict) -> dict:
+    """Everything needed to check an artifact against the data and thresholds it was trained for"""
+    return {
+        "version": version,
+        "created_at": pd.Timestamp.now().isoformat(),
+        "model_type": type(model).__name__,
+        "features": features,
+        "target": TARGET_COLUMN,
+        "risk_thresholds": [LOW_RISK_THRESHOLD, HIGH_RISK_THRESHOLD],
+        "data_file": PROCESSED_DATA_PATH,
+        "data_sha256": data_hash,
+        "params": search.best_params_,
+        "cv": {"strategy": "GroupKFold by postal sector", "folds": search.n_splits_, **cv_metrics(search)},
+        "training_seconds": round(training_seconds, 3),
+        "inference": latency,
+    }
+
+
+def _atomic_copy(source: Path, destination: str) -> None:
+    tmp_path = f"{destination}.{os.getpid()}.tmp"
+    shutil.copyfile(source, tmp_path)
+    os.replace(tmp_path, destination)
+
+
+def save_artifact(model, manifest: dict, model_dir: str = MODEL_DIR, publish: bool = True) -> Path:
+    """Write a versioned model + manifest and optionally publish it as the API's model"""
+    version_dir = Path(model_dir) / manifest["version"]
+    version_dir.mkdir(parents=True, exist_ok=True)
+    model_file = version_dir / "model.pkl"
+    with open(model_file, "wb") as f:
+        pickle.dump(model, f)
+    manifest["model_sha256"] = file_sha256(model_file)
+    manifest_file = version_dir / "manifest.json"
+    with open(manifest_file, "w") as f:
+        json.dump(manifest, f, indent=2, default=str)
+
+    if publish:
+        # Model first, manifest last: until the manifest is replaced the API
+        # refuses the new pickle rather than serving it unchecked
+        _atomic_copy(model_file, MODEL_PATH)
+        _atomic_copy(manifest_file, MODEL_MANIFEST_PATH)
+        logger.info(f"Published model {manifest['version']} to {MODEL_PATH}")
+    return version_dir
+
+
+def load_manifest(path: str = MODEL_MANIFEST_PATH):
+    """Load the published model manifest, or None if the model predates manifests"""
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def check_model_manifest(manifest: dict, model, data: pd.DataFrame,
+                         model_path: str = MODEL_PATH, data_path: str = PROCESSED_DATA_PATH) -> None:
+    """Raise ValueError if the loaded model, data or thresholds differ from what the manifest records"""
+    problems = []
+    if file_sha256(model_path) != manifest.get("model_sha256"):
+        problems.append(f"{model_path} does not match the manifest checksum")
+    if file_sha256(data_path) != manifest.get("data_sha256"):
+        problems.append(f"{data_path} is not the data the model was trained on")
+    if feature_columns(data) != manifest.get("features"):
+        problems.append("feature columns differ from the training feature order")
+    model_features = getattr(model, "feature_names_in_", None)
+    if model_features is not None and list(model_features) != manifest.get("features"):
+        problems.append("model feature names differ from the manifest")
+    if manifest.get("risk_thresholds") != [LOW_RISK_THRESHOLD, HIGH_RISK_THRESHOLD]:
+        problems.append(
+            f"risk thresholds {manifest.get('risk_thresholds')} differ from the API's "
+            f"{[LOW_RISK_THRESHOLD, HIGH_RISK_THRESHOLD]}"
+        )
+    if problems:
+        raise ValueError(f"Model {manifest.get('version')} failed manifest checks: " + "; ".join(problems))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train and version the dengue risk model")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="parallel CV workers (-1 = all CPUs)")
+    parser.add_argument("--folds", type=int, default=CV_FOLDS)
+    parser.add_argument("--no-publish", action="store_true",
+                        help=f"only write the versioned artifact, leave {MODEL_PATH} untouched")
+    args = parser.parse_args()
+
+    data_hash = file_sha256(PROCESSED_DATA_PATH)
+    with open(PROCESSED_DATA_PATH, "rb") as f:
+        data = pickle.load(f)
+    X, y, groups = build_training_set(data)
+    logger.info(f"Training on {X.shape[0]} rows x {X.shape[1]} features from {len(np.unique(groups))} postal sectors")
+
+    start_time = time.time()
+    search = search_hyperparameters(X, y, groups, args.folds, args.n_jobs)
+    training_seconds = time.time() - start_time
+    model = search.best_estimator_
+    latency = measure_inference_latency(model, X)
+
+    version = f"{pd.Timestamp.now():%Y%m%d_%H%M%S}-{data_hash[:8]}"
+    manifest = build_manifest(version, model, list(X.columns), data_hash, search, training_seconds, latency)
+    version_dir = save_artifact(model, manifest, publish=not args.no_publish)
+
+    cv = manifest["cv"]
+    logger.info(f"Best params: {manifest['params']}")
+    logger.info(f"CV RMSE {cv['rmse']} (+/- {cv['rmse_std']}), MAE {cv['mae']}, R2 {cv['r2']}")
+    logger.info(
+        f"Training {training_seconds:.2f}s; inference p50 {latency['single_row_ms_p50']} ms/row single, "
+        f"{latency['batch_us_per_row']} us/row batched"
+    )
+    logger.info(f"Saved model {version} to {version_dir}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,151 @@
+import pandas as pd
+import numpy as np
+import pickle
+import logging
+import time
+
+logger = logging.getLogger("risk_grid")
+
+# Prediction thresholds separating Low / Medium / High risk
+LOW_RISK_THRESHOLD = 1.044
+HIGH_RISK_THRESHOLD = 3.273
+RISK_THRESHOLDS = np.array([LOW_RISK_THRESHOLD, HIGH_RISK_THRESHOLD])
+RISK_LEVELS = np.array(["Low", "Medium", "High"])
+
+# Tiles are square cells of this many degrees (~5.5 km at Singapore's latitude)
+TILE_SIZE_DEG = 0.05
+
+RISK_GRID_PATH = "risk_grid.pkl"
+
+
+def classify_risk(predictions: np.ndarray) -> np.ndarray:
+    """Map an array of prediction values to risk codes (0 = Low, 1 = Medium, 2 = High)"""
+    return np.digitize(predictions, RISK_THRESHOLDS).astype(np.int8)
+
+
+def first_landuse_rows(data: pd.DataFrame, landuse_types) -> dict:
+    """Position of the first row in data for each landuse type that has one"""
+    rows = {}
+    for landuse_type in landuse_types:
+        if landuse_type in data.columns:
+            matching = np.flatnonzero((data[landuse_type] == 1).to_numpy())
+            if len(matching):
+                rows[landuse_type] = int(matching[0])
+    return rows
+
+
+def score_landuse_types(data: pd.DataFrame, feature_matrix: np.ndarray, model, landuse_types) -> pd.Series:
+    """Predict once per landuse type in a single batched model call; NaN where data has no row
+
+    feature_matrix holds data's rows in the model's feature order (see
+    model_training.build_feature_matrix), the same rows /predict slices.
+    """
+    landuse_types = pd.Index(landuse_types)
+    rows = first_landuse_rows(data, landuse_types)
+    predictions = pd.Series(np.nan, index=landuse_types, dtype=np.float64)
+    if rows:
+        predictions[list(rows)] = model.predict(feature_matrix[list(rows.values())])
+    return predictions
+
+
+def score_postal_codes(postal_mapping: pd.DataFrame, data: pd.DataFrame, feature_matrix: np.ndarray,
+                       model) -> pd.DataFrame:
+    """Predict and classify risk for every postal code in one batched model call"""
+    start_time = time.time()
+
+    # The model only sees landuse-level features, so score each landuse type
+    # once and broadcast the result to its postal codes
+    landuse_codes, landuse_types = pd.factorize(postal_mapping["landuse_type"])
+    logger.info(f"Scoring {len(landuse_types)} landuse types for {len(postal_mapping)} postal codes")
+    type_predictions = score_landuse_types(data, feature_matrix, model, landuse_types).to_numpy()
+
+    # factorize codes a missing landuse type as -1, which would otherwise
+    # index the last type's prediction
+    predictions = np.full(len(landuse_codes), np.nan)
+    has_type = landuse_codes >= 0
+    predictions[has_type] = type_predictions[landuse_codes[has_type]]
+    known = ~np.isnan(predictions)
+
+    scored_df = pd.DataFrame({
+        "postal_code": postal_mapping["postal_code"].to_numpy(dtype=np.int32)[known],
+        "lat": postal_mapping["postal_lat"].to_numpy(dtype=np.float32)[known],
+        "lon": postal_mapping["postal_lon"].to_numpy(dtype=np.float32)[known],
+        "prediction": predictions[known].astype(np.float32),
+    })
+    scored_df["risk_code"] = classify_risk(scored_df["prediction"].to_numpy())
+
+    logger.info(
+        f"Scored {len(scored_df)} postal codes in {time.time() - start_time:.2f} seconds "
+        f"({int((~known).sum())} skipped with unknown landuse type)"
+    )
+    return scored_df
+
+
+def build_tiles(scored_df: pd.DataFrame, tile_size_deg: float = TILE_SIZE_DEG) -> dict:
+    """Group scored points into square lat/lon tiles holding one array per column"""
+    lat = scored_df["lat"].to_numpy()
+    lon = scored_df["lon"].to_numpy()
+    origin_lat = float(np.floor(lat.min() / tile_size_deg) * tile_size_deg) if len(lat) else 0.0
+    origin_lon = float(np.floor(lon.min() / tile_size_deg) * tile_size_deg) if len(lon) else 0.0
+
+    tile_y = np.floor((lat - origin_lat) / tile_size_deg).astype(np.int32)
+    tile_x = np.floor((lon - origin_lon) / tile_size_deg).astype(np.int32)
+
+    # Sort once by tile so every tile is a contiguous slice
+    order = np.lexsort((tile_x, tile_y))
+    keys = np.stack([tile_y[order], tile_x[order]], axis=1)
+    boundaries = np.flatnonzero(np.any(keys[1:] != keys[:-1], axis=1)) + 1
+    starts = np.concatenate(([0], boundaries)) if len(order) else np.array([], dtype=int)
+    stops = np.concatenate((boundaries, [len(order)])) if len(order) else np.array([], dtype=int)
+
+    columns = {name: scored_df[name].to_numpy()[order] for name in scored_df.columns}
+    tiles = {}
+    for start, stop in zip(starts, stops):
+        key = (int(keys[start, 0]), int(keys[start, 1]))
+        tiles[key] = {name: values[start:stop] for name, values in columns.items()}
+
+    return {
+        "tile_size_deg": tile_size_deg,
+        "origin_lat": origin_lat,
+        "origin_lon": origin_lon,
+        "risk_levels": RISK_LEVELS.tolist(),
+        "thresholds": RISK_THRESHOLDS.tolist(),
+        "tiles": tiles,
+    }
+
+
+def build_risk_grid(all_data: dict, data: pd.DataFrame, feature_matrix: np.ndarray, model,
+                    model_sha256: str = None) -> dict:
+    """Score every postal code and tile the result, recording the model it was scored with"""
+    scored_df = score_postal_codes(all_data["postal_landuse_mapping"], data, feature_matrix, model)
+    grid = build_tiles(scored_df)
+    grid["model_sha256"] = model_sha256
+    logger.info(f"Built risk grid with {len(grid['tiles'])} tiles")
+    return grid
+
+
+def main():
+    # Imported here since model_training imports the risk thresholds from this module
+    from model_training import (
+        MODEL_PATH, PROCESSED_DATA_PATH, build_feature_matrix, file_sha256, load_manifest,
+        model_feature_order
+    )
+
+    with open("combined_data.pkl", "rb") as f:
+        all_data = pickle.load(f)
+    with open(PROCESSED_DATA_PATH, "rb") as f:
+        data = pickle.load(f)
+    with open(MODEL_PATH, "rb") as f:
+        model = pickle.load(f)
+
+    feature_matrix = build_feature_matrix(data, model_feature_order(model, data, load_manifest()), model)
+    grid = build_risk_grid(all_data, data, feature_matrix, model, file_sha256(MODEL_PATH))
+
+    with open(RISK_GRID_PATH, "wb") as f:
+        pickle.dump(grid, f)
+    logger.info(f"Saved risk grid to {RISK_GRID_PATH}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,48 @@
+import asyncio
+import logging
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger("single_flight")
+
+
+class SingleFlight:
+    """Coalesce concurrent identical calls into one in-flight computation
+
+    The first caller for a (name, key) starts func in the threadpool; callers
+    arriving while it runs await the same result instead of recomputing it.
+    Results are shared between callers, so func must return something they
+    will not mutate (e.g. encoded bytes). Nothing is cached once it finishes.
+    """
+
+    def __init__(self):
+        self._in_flight = {}
+        self.stats = {}
+
+    def _finished(self, flight_key, task) -> None:
+        self._in_flight.pop(flight_key, None)
+        # Mark the exception retrieved even if every caller went away
+        if not task.cancelled():
+            task.exception()
+
+    async def run(self, name: str, key, func, *args):
+        """Run func(*args) once for all concurrent callers with the same name and key"""
+        stats = self.stats.setdefault(name, {"calls": 0, "executions": 0, "coalesced": 0})
+        stats["calls"] += 1
+        flight_key = (name, key)
+        task = self._in_flight.get(flight_key)
+        if task is None:
+            task = asyncio.ensure_future(run_in_threadpool(func, *args))
+            self._in_flight[flight_key] = task
+            task.add_done_callback(lambda done: self._finished(flight_key, done))
+            stats["executions"] += 1
+        else:
+            stats["coalesced"] += 1
+        # A disconnecting caller must not cancel the work the others wait on
+        return await asyncio.shield(task)
+
+    def report(self) -> dict:
+        """Calls, executions and coalesced calls per name, plus what is in flight now"""
+        return {
+            "in_flight": len(self._in_flight),
+            "by_name": {name: dict(stats) for name, stats in self.stats.items()},
+        }
@@ -0,0 +1,197 @@
+# Record API traffic and replay it against a local instance as a load test.
+# Start the API with ACCESS_RECORD_PATH=access_record.tsv to record, then e.g.
+#   python traffic_replay.py replay access_record.tsv --sweep 1,2,4,8,16,32
+import argparse
+import asyncio
+import json
+import logging
+import time
+import numpy as np
+
+logger = logging.getLogger("traffic_replay")
+
+RECORD_HEADER = "# dengue-api access record v1: timestamp method path query postal_code\n"
+
+# A sweep step is saturated when the server completes less than this share
+# of the offered request rate, or more than this share of requests fail
+SATURATION_THROUGHPUT_RATIO = 0.9
+SATURATION_ERROR_RATE = 0.01
+
+
+def _clean(value: str) -> str:
+    return value.replace("\t", " ").replace("\n", " ")
+
+
+def format_record(timestamp: float, method: str, path: str, query: str, postal_code: str = "") -> str:
+    """One tab-separated record line"""
+    return f"{timestamp:.3f}\t{method}\t{_clean(path)}\t{_clean(query)}\t{_clean(postal_code)}\n"
+
+
+def read_records(path: str):
+    """Read a record file into (offset_seconds, method, path, query, postal_code) tuples"""
+    records = []
+    with open(path) as f:
+        for line in f:
+            if line.startswith("#") or not line.strip():
+                continue
+            timestamp, method, url_path, query, postal_code = line.rstrip("\n").split("\t")
+            records.append((float(timestamp), method, url_path, query, postal_code))
+    records.sort(key=lambda record: record[0])
+    if records:
+        first = records[0][0]
+        records = [(timestamp - first, *rest) for timestamp, *rest in records]
+    return records
+
+
+async def _send(client, record, results):
+    _, method, path, query, postal_code = record
+    url = f"{path}?{query}" if query else path
+    start = time.perf_counter()
+    try:
+        if method == "POST" and path == "/predict":
+            response = await client.post(url, json={"postal_code": postal_code})
+        else:
+            response = await client.request(method, url)
+        status = response.status_code
+    except Exception as e:
+        logger.debug(f"{method} {url} failed: {str(e)}")
+        status = None
+    results.append((path, status, time.perf_counter() - start))
+
+
+async def replay(records, base_url: str, speed: float, max_in_flight: int, timeout: float):
+    """Replay records at speed x their recorded pace (speed 0 sends as fast as possible)"""
+    import httpx
+
+    results = []
+    in_flight = asyncio.Semaphore(max_in_flight)
+    limits = httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight)
+
+    async def send(record):
+        try:
+            await _send(client, record, results)
+        finally:
+            in_flight.release()
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        # Start each request only once it is due and a slot is free, so the
+        # number of pending tasks stays bounded by max_in_flight
+        tasks = set()
+        start = time.perf_counter()
+        for record in records:
+            if speed > 0:
+                delay = start + record[0] / speed - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            await in_flight.acquire()
+            task = asyncio.create_task(send(record))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+
+    return summarize(records, results, speed, elapsed)
+
+
+def summarize(records, results, speed: float, elapsed: float) -> dict:
+    """Latency distribution, error rate and throughput of one replay run"""
+    statuses = [status for _, status, _ in results]
+    latencies_ms = np.array([latency for _, _, latency in results]) * 1000
+    errors = sum(1 for status in statuses if status is None or status >= 500)
+    client_errors = sum(1 for status in statuses if status is not None and 400 <= status < 500)
+
+    recorded_span = records[-1][0] if records else 0.0
+    offered_rps = len(records) / (recorded_span / speed) if speed > 0 and recorded_span > 0 else None
+
+    def percentiles(values):
+        if len(values) == 0:
+            return {}
+        return {
+            f"p{p}": round(float(np.percentile(values, p)), 2) for p in (50, 90, 95, 99)
+        } | {"max": round(float(values.max()), 2)}
+
+    by_endpoint = {}
+    for path in sorted({path for path, _, _ in results}):
+        endpoint_latencies = np.array([latency for p, _, latency in results if p == path]) * 1000
+        by_endpoint[path] = {"requests": len(endpoint_latencies), **percentiles(endpoint_latencies)}
+
+    return {
+        "speed": speed,
+        "requests": len(results),
+        "elapsed_seconds": round(elapsed, 3),
+        "offered_rps": round(offered_rps, 2) if offered_rps else None,
+        "throughput_rps": round(len(results) / elapsed, 2) if elapsed > 0 else None,
+        "error_rate": round(errors / len(results), 4) if results else 0.0,
+        "client_error_rate": round(client_errors / len(results), 4) if results else 0.0,
+        "latency_ms": percentiles(latencies_ms),
+        "latency_ms_by_endpoint": by_endpoint,
+    }
+
+
+def is_saturated(summary: dict) -> bool:
+    """Whether the server failed to keep up with the offered load in a run"""
+    if summary["error_rate"] > SATURATION_ERROR_RATE:
+        return True
+    offered = summary["offered_rps"]
+    return bool(offered) and summary["throughput_rps"] < SATURATION_THROUGHPUT_RATIO * offered
+
+
+def print_summary(summary: dict) -> None:
+    latency = summary["latency_ms"]
+    print(
+        f"speed x{summary['speed']:g}: {summary['requests']} requests in {summary['elapsed_seconds']:.2f}s, "
+        f"offered {summary['offered_rps']} rps, achieved {summary['throughput_rps']} rps, "
+        f"errors {summary['error_rate'] * 100:.2f}% (4xx {summary['client_error_rate'] * 100:.2f}%), "
+        f"latency ms p50 {latency.get('p50')} p95 {latency.get('p95')} p99 {latency.get('p99')} max {latency.get('max')}"
+    )
+    for path, stats in summary["latency_ms_by_endpoint"].items():
+        print(f"    {path}: {stats['requests']} requests, p50 {stats.get('p50')} p95 {stats.get('p95')} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded API traffic as a load test")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    replay_parser = subparsers.add_parser("replay", help="replay a record file")
+    replay_parser.add_argument("record_file")
+    replay_parser.add_argument("--base-url", default="http://localhost:8000")
+    replay_parser.add_argument("--speed", type=float, default=1.0,
+                               help="playback speed multiplier; 0 sends everything at once")
+    replay_parser.add_argument("--sweep", help="comma-separated speeds to step through until saturation")
+    replay_parser.add_argument("--max-in-flight", type=int, default=500)
+    replay_parser.add_argument("--timeout", type=float, default=30.0)
+    replay_parser.add_argument("--json", dest="json_path", help="write the run summaries to this file")
+    args = parser.parse_args()
+
+    records = read_records(args.record_file)
+    print(f"Loaded {len(records)} requests spanning {records[-1][0] if records else 0:.1f}s")
+    if not records:
+        return
+
+    speeds = [float(speed) for speed in args.sweep.split(",")] if args.sweep else [args.speed]
+    summaries = []
+    saturation = None
+    for speed in speeds:
+        summary = asyncio.run(replay(records, args.base_url, speed, args.max_in_flight, args.timeout))
+        summaries.append(summary)
+        print_summary(summary)
+        if args.sweep and is_saturated(summary):
+            saturation = summary
+            break
+
+    if args.sweep:
+        if saturation:
+            print(f"Saturated at x{saturation['speed']:g} "
+                  f"(offered {saturation['offered_rps']} rps, achieved {saturation['throughput_rps']} rps)")
+        else:
+            print("No saturation reached in the sweep")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"runs": summaries, "saturated_at": saturation}, f, indent=2)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    # httpx logs every request at INFO, which drowns out the summaries
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    main()